@@ -1,15 +1,27 @@
 import json
+import multiprocessing
 import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Callable, DefaultDict, Dict, Iterator, List, Optional, Tuple
+
+# Optional imports - faster JSON (falls back to the stdlib encoder)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 BASE_PATH = Path(__file__).parent
 DATASET_ROOT = BASE_PATH / "_21p1_pjirayu_Seed-Crystallization-Dataset" / "balanced_crystallization"
 FILTER_OUTPUT = BASE_PATH / "Filter"
 
-# Allowed image extensions (Case Insensitive)
-VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff'}
+# Allowed image extensions (Case Insensitive, without the leading dot)
+VALID_EXTENSIONS = frozenset({'jpg', 'jpeg', 'png', 'bmp', 'tif', 'tiff'})
 
 PROCESS_FLOW = {
     "unsaturated": {
@@ -144,33 +156,86 @@ MATERIALS = {
     "vir_polymer": "Virtual Polymer"
 }
 
-def find_folder_insensitive(base_path: Path, target_name: str) -> Path:
-    """Finds a folder ignoring case (e.g., finds 'Unsaturated' for 'unsaturated')."""
+PHASES = ["unsaturated", "labile", "intermediate", "metastable"]
+
+# One folder-listing thread per (material, phase) pair
+SCAN_WORKERS = 12
+
+# Images live directly in DATASET_ROOT/<material>/<phase>/; list only materials
+# whose phase folders contain nested sub-folders of images here
+RECURSIVE_SCAN_MATERIALS = frozenset()
+
+# Phase folders with more images than this are captioned and serialized in
+# worker processes, CAPTION_BATCH_SIZE images per task
+PARALLEL_CAPTION_THRESHOLD = 10_000
+CAPTION_BATCH_SIZE = 1000
+
+# Write buffer for the streamed per-phase caption files (many small writes)
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+def find_folder_insensitive(base_path: Path, target_name: str,
+                            listing_cache: Optional[Dict[Path, Dict[str, Path]]] = None) -> Path:
+    """Finds a folder ignoring case (e.g., finds 'Unsaturated' for 'unsaturated').
+    
+    listing_cache (parent -> lower-cased child folder index) lets the caller
+    reuse one directory listing across lookups; it is only as fresh as the caller keeps it.
+    """
     if not base_path.exists():
         return None
     
     # 1. Try exact match first
     exact_match = base_path / target_name
-    if exact_match.exists() and exact_match.is_dir():
+    if exact_match.is_dir():
         return exact_match
 
-    # 2. Try case-insensitive scan
-    for item in base_path.iterdir():
-        if item.is_dir() and item.name.lower() == target_name.lower():
-            return item
-            
-    return None
+    # 2. Case-insensitive lookup in the (cached) listing, first spelling wins
+    index = listing_cache.get(base_path) if listing_cache is not None else None
+    if index is None:
+        index = {}
+        for item in base_path.iterdir():
+            if item.is_dir():
+                index.setdefault(item.name.lower(), item)
+        if listing_cache is not None:
+            listing_cache[base_path] = index
+    
+    return index.get(target_name.lower())
 
-def get_images_in_folder(path: Path) -> List[Path]:
-    """Get all valid images in a folder (recursive)."""
-    images = []
+def _iter_images(root, recursive: bool = True) -> Iterator[str]:
+    """Yield the names of valid images in root (iterative os.scandir walk when recursive)."""
+    valid_extensions = VALID_EXTENSIONS
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                # Suffix test first: it is pure string work, and most entries are images.
+                # DirEntry type checks reuse the data from the directory read (no extra stat)
+                name = entry.name
+                dot = name.rfind('.')
+                if dot >= 0 and name[dot + 1:].lower() in valid_extensions and entry.is_file():
+                    yield name
+                elif recursive and entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+
+def iter_images(path: Path, recursive: bool = False) -> Iterator[str]:
+    """Lazily yield the names of valid images in a folder, unsorted (nothing if it is missing)."""
     if not path or not path.exists():
-        return images
+        return iter(())
+    return _iter_images(path, recursive)
+
+def count_images(path: Path, recursive: bool = False) -> int:
+    """Count the valid images in a folder without materializing or sorting their names."""
+    return sum(1 for _ in iter_images(path, recursive))
 
-    for file_path in path.rglob("*"):
-        if file_path.is_file() and file_path.suffix.lower() in VALID_EXTENSIONS:
-            images.append(file_path)
-    return sorted(images)
+def get_images_in_folder(path: Path, recursive: bool = False, sort: bool = True) -> List[str]:
+    """Get the names of all valid images in a folder (sub-folders only if recursive).
+    
+    sort keeps the caption files deterministic between runs; pass sort=False when
+    the order does not matter to skip the O(N log N) pass.
+    """
+    images = list(iter_images(path, recursive))
+    if sort:
+        images.sort()
+    return images
 
 # def generate_caption(phase: str, material_key: str, material_name: str, image_name: str) -> Dict:
 #     """Generate caption using the material-specific template."""
@@ -203,44 +268,156 @@ def get_images_in_folder(path: Path) -> List[Path]:
 #         "timestamp": datetime.now().isoformat()
 #     }
 
-def generate_caption(phase: str, material_key: str, material_name: str, image_name: str) -> Dict:
-    """Generate caption with Process Step integration."""
+_FALLBACK_TEMPLATE = "Image of {material} in {phase}."
+
+def _render_template(template: str, material: str, phase: str, steps: str, next_step: str) -> str:
+    """Fill a caption template (rendered once per (material, phase) pair, not per image)."""
+    return template.format(material=material, phase=phase, steps=steps, next_step=next_step)
+
+# Flat (material_key, phase) -> (initial_caption, visual_markers, process_stage,
+# next_process_stage, process_description) for the known pairs, rendered once at
+# import so a pair's fields come from one lookup and a tuple unpack
+_FLAT_TEMPLATES: Dict[Tuple[str, str], Tuple[str, Tuple[str, ...], str, str, str]] = {
+    (material_key, phase): (
+        _render_template(config["template"], MATERIALS[material_key], phase,
+                         process_info["current_steps"], process_info["next_milestone"]),
+        tuple(config["visual_markers"]),
+        process_info["current_steps"],
+        process_info["next_milestone"],
+        process_info["description"]
+    )
+    for material_key, phases in MATERIAL_SPECIFIC_TEMPLATES.items()
+    for phase, config in phases.items()
+    for process_info in [PROCESS_FLOW[phase]]
+}
+
+def get_visual_markers_ref(material_key: str, phase: str) -> str:
+    return f"{material_key}_{phase}"
+
+def build_visual_markers_index() -> Dict[str, Tuple[str, ...]]:
+    """Sidecar mapping visual_markers_ref -> marker list (unknown refs have no markers)."""
+    return {
+        get_visual_markers_ref(material_key, phase): record[1]
+        for (material_key, phase), record in _FLAT_TEMPLATES.items()
+    }
+
+def _build_caption_prototype(phase: str, material_key: str, material_name: str) -> Dict:
+    """Build every caption field that is constant for a (material, phase) pair."""
     
-    if material_key not in MATERIAL_SPECIFIC_TEMPLATES:
-        visual_config = {
-            "template": "Image of {material} in {phase}.", 
-            "visual_markers": []
-        }
+    record = _FLAT_TEMPLATES.get((material_key, phase))
+    if record is not None and MATERIALS.get(material_key) == material_name:
+        caption, _, process_stage, next_process_stage, process_description = record
     else:
-        visual_config = MATERIAL_SPECIFIC_TEMPLATES[material_key][phase]
-
-    process_info = PROCESS_FLOW.get(phase, {
-        "current_steps": "Unknown Step", 
-        "next_milestone": "Unknown"
-    })
-
-    caption = visual_config["template"].format(
-        material=material_name, 
-        phase=phase,
-        steps=process_info["current_steps"],
-        next_step=process_info["next_milestone"]
-    )
+        if material_key not in MATERIAL_SPECIFIC_TEMPLATES:
+            template = _FALLBACK_TEMPLATE
+        else:
+            template = MATERIAL_SPECIFIC_TEMPLATES[material_key][phase]["template"]
+
+        process_info = PROCESS_FLOW.get(phase, {
+            "current_steps": "Unknown Step", 
+            "next_milestone": "Unknown"
+        })
+
+        caption = _render_template(template, material_name, phase,
+                                   process_info["current_steps"], process_info["next_milestone"])
+        process_stage = process_info["current_steps"]
+        next_process_stage = process_info["next_milestone"]
+        process_description = process_info["description"]
     
     return {
-        "image": image_name,
+        "image": None,
         "category_id": material_key,
         "category_name": material_name,
         "phase": phase,
-        "process_stage": process_info["current_steps"],
-        "next_process_stage": process_info["next_milestone"],
-        "process_description": process_info["description"],
+        "process_stage": process_stage,
+        "next_process_stage": next_process_stage,
+        "process_description": process_description,
         "initial_caption": caption,
-        "visual_markers": visual_config["visual_markers"],
+        # Key into visual_markers_index.json (markers are shared by the whole pair)
+        "visual_markers_ref": get_visual_markers_ref(material_key, phase),
         "llm_verification_status": "pending",
-        "timestamp": datetime.now().isoformat()
+        # Run start as epoch seconds (float); timestamp_to_iso() gives the old ISO string
+        "timestamp": None
     }
 
-def process_dataset() -> Tuple[List[Dict], Dict]:
+def timestamp_to_iso(timestamp: float) -> str:
+    """Convert a caption's epoch-seconds timestamp to an ISO-8601 string (pre-epoch format)."""
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+def _dumps(obj, indent: bool = False) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes (orjson when installed)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _loads(data: bytes):
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+
+def _make_caption_serializer(phase: str, material_key: str, material_name: str, timestamp: float) -> Callable[[str], bytes]:
+    """Serialize captions for one (material, phase) pair straight to JSON bytes.
+
+    Output matches _dumps of the _build_caption_prototype record with image and
+    timestamp filled in; every field except the image name is encoded once here.
+    """
+    prototype = _build_caption_prototype(phase, material_key, material_name)
+    static_fields = {key: value for key, value in prototype.items() if key not in ("image", "timestamp")}
+    # image is the first key and timestamp the last, so the static fields sit between them
+    tail = b"," + _dumps(static_fields)[1:-1] + b',"timestamp":' + _dumps(timestamp) + b"}"
+
+    def serialize(image_name: str) -> bytes:
+        return b'{"image":' + _dumps(image_name) + tail
+    return serialize
+
+def get_phase_captions_file(phase: str) -> Path:
+    """Per-phase caption file written by CaptionStreamWriter."""
+    return FILTER_OUTPUT / "annotated_caption" / f"{phase}_captions.json"
+
+class CaptionStreamWriter:
+    """Streams captions into one compact JSON array file per phase.
+
+    A phase file is created when its first record is written, so phases without
+    images get no file; files left by an earlier run are removed up front.
+    """
+
+    def __init__(self, phases: List[str]):
+        os.makedirs(FILTER_OUTPUT / "annotated_caption", exist_ok=True)
+        for phase in phases:
+            get_phase_captions_file(phase).unlink(missing_ok=True)
+        self.files = {}
+        self.counts = dict.fromkeys(phases, 0)
+
+    def write_serialized(self, phase: str, data: bytes, count: int) -> None:
+        """Append count already-serialized records (joined by ",\\n") to a phase file."""
+        if not count:
+            return
+        f = self.files.get(phase)
+        if f is None:
+            f = self.files[phase] = open(get_phase_captions_file(phase), 'wb', buffering=WRITE_BUFFER_SIZE)
+            f.write(b"[\n")
+        else:
+            f.write(b",\n")
+        f.write(data)
+        self.counts[phase] += count
+
+    def close(self) -> None:
+        for f in self.files.values():
+            f.write(b"\n]\n")
+            f.close()
+
+def _caption_batch(task: Tuple[str, str, str, List[str], float]) -> Tuple[bytes, int]:
+    """Pool worker: serialize the captions for one batch of image names."""
+    phase, material_key, material_name, image_names, timestamp = task
+    serialize = _make_caption_serializer(phase, material_key, material_name, timestamp)
+    return b",\n".join(map(serialize, image_names)), len(image_names)
+
+def process_dataset(stats_only: bool = False) -> Tuple[int, Dict]:
+    """Caption the dataset and return (caption count, statistics).
+    
+    With stats_only the folders are only counted: no caption files are written
+    and the returned count is the number of images found.
+    """
     print("=" * 70)
     print("Crystallization Image Caption Generation (Specific Material Mode)")
     print("=" * 70)
@@ -248,67 +425,36 @@ def process_dataset() -> Tuple[List[Dict], Dict]:
     
     if not DATASET_ROOT.exists():
         print(f"[ERROR] Dataset root not found at: {DATASET_ROOT}")
-        return [], {}
+        return 0, {}
 
-    all_captions = []
-    statistics = {
-        "total_images": 0,
-        "by_material": {},
-        "by_phase": {},
-        "errors": []
-    }
+    run_timestamp = time.time()
+    writer = None if stats_only else CaptionStreamWriter(PHASES)
+    # material_key -> Counter(phase -> image count); converted to plain dicts below
+    material_counts: DefaultDict[str, Counter] = defaultdict(Counter)
+    errors: List[str] = []
     
-    # Iterate through expected materials
-    for material_key, material_human_name in MATERIALS.items():
-        material_path = find_folder_insensitive(DATASET_ROOT, material_key)
-        
-        if not material_path:
-            print(f"[WARNING] Folder not found: {material_key} (Skipping...)")
-            continue
-            
-        print(f"\nProcessing Category: {material_human_name}")
-        print(f"  Folder Found: {material_path.name}")
-        print("-" * 70)
-        
-        statistics["by_material"][material_key] = {
-            "material_name": material_human_name,
-            "total_images": 0,
-            "by_phase": {}
-        }
-        
-        # Iterate through phases
-        for phase_key in ["unsaturated", "labile", "intermediate", "metastable"]:
-            phase_path = find_folder_insensitive(material_path, phase_key)
-            
-            if not phase_path:
-                print(f"  {phase_key.upper():15} : [NOT FOUND] Folder missing")
-                continue
+    try:
+        _process_materials(writer, material_counts, errors, run_timestamp)
+    finally:
+        if writer is not None:
+            writer.close()
 
-            images = get_images_in_folder(phase_path)
-            image_count = len(images)
-            
-            print(f"  {phase_key.upper():15} : {image_count:3} images")
-            
-            if image_count == 0:
-                print(f"    -> Checked {phase_path}")
-                print(f"    -> [WARNING] Folder exists but contains no recognized images!")
-            
-            statistics["total_images"] += image_count
-            statistics["by_material"][material_key]["total_images"] += image_count
-            statistics["by_material"][material_key]["by_phase"][phase_key] = image_count
-            
-            if phase_key not in statistics["by_phase"]:
-                statistics["by_phase"][phase_key] = 0
-            statistics["by_phase"][phase_key] += image_count
-            
-            try:
-                for image_file in images:
-                    caption_data = generate_caption(phase_key, material_key, material_human_name, image_file.name)
-                    all_captions.append(caption_data)
-            except Exception as e:
-                error_msg = f"Error processing {phase_path}: {str(e)}"
-                print(f"  ERROR: {error_msg}")
-                statistics["errors"].append(error_msg)
+    phase_counts = Counter()
+    for counts in material_counts.values():
+        phase_counts.update(counts)
+    statistics = {
+        "total_images": sum(phase_counts.values()),
+        "by_material": {
+            material_key: {
+                "material_name": MATERIALS[material_key],
+                "total_images": sum(counts.values()),
+                "by_phase": dict(counts)
+            }
+            for material_key, counts in material_counts.items()
+        },
+        "by_phase": dict(phase_counts),
+        "errors": errors
+    }
 
     print("\n" + "=" * 70)
     print("STATISTICS")
@@ -318,37 +464,152 @@ def process_dataset() -> Tuple[List[Dict], Dict]:
     for mat_key, data in statistics["by_material"].items():
         print(f"  {data['material_name']:30} : {data['total_images']:4} images")
     
-    return all_captions, statistics
+    if writer is None:
+        return statistics["total_images"], statistics
+    return sum(writer.counts.values()), statistics
 
-def save_captions(captions: List[Dict], statistics: Dict) -> None:
-    os.makedirs(FILTER_OUTPUT / "annotated_caption", exist_ok=True)
+def _process_materials(writer: Optional[CaptionStreamWriter], material_counts: DefaultDict[str, Counter],
+                       errors: List[str], run_timestamp: float) -> None:
+    """Scan every material/phase folder and stream its captions into writer (count only if None)."""
+    # Folder listings are reused for this run only, so a later run sees renamed folders
+    listing_cache: Dict[Path, Dict[str, Path]] = {}
+    material_paths = {
+        material_key: find_folder_insensitive(DATASET_ROOT, material_key, listing_cache)
+        for material_key in MATERIALS
+    }
+    phase_paths = {
+        (material_key, phase_key): find_folder_insensitive(material_path, phase_key, listing_cache)
+        for material_key, material_path in material_paths.items() if material_path
+        for phase_key in PHASES
+    }
     
-    all_captions_file = FILTER_OUTPUT / "all_initial_captions.json"
-    with open(all_captions_file, 'w', encoding='utf-8') as f:
-        json.dump(captions, f, indent=2, ensure_ascii=False)
+    # Folder listing is syscall-bound and os.scandir releases the GIL, so all
+    # phase folders are listed concurrently; statistics and captions are still
+    # collated sequentially below
+    scan_jobs = {key: path for key, path in phase_paths.items() if path}
+    # Statistics alone only need the counts, not the sorted name lists
+    scan_folder = count_images if writer is None else get_images_in_folder
+    with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(scan_jobs)) or 1) as executor:
+        listings = {
+            key: executor.submit(scan_folder, path, key[0] in RECURSIVE_SCAN_MATERIALS)
+            for key, path in scan_jobs.items()
+        }
     
-    captions_by_phase = {}
-    for caption in captions:
-        phase = caption["phase"]
-        if phase not in captions_by_phase:
-            captions_by_phase[phase] = []
-        captions_by_phase[phase].append(caption)
+    # Only pay for worker processes when some folder is large enough to need them
+    needs_pool = writer is not None and any(
+        not listing.exception() and len(listing.result()) > PARALLEL_CAPTION_THRESHOLD
+        for listing in listings.values()
+    )
+    
+    with (multiprocessing.Pool() if needs_pool else nullcontext()) as pool:
+        # Iterate through expected materials
+        for material_key, material_human_name in MATERIALS.items():
+            material_path = material_paths[material_key]
+            
+            if not material_path:
+                print(f"[WARNING] Folder not found: {material_key} (Skipping...)")
+                continue
+                
+            print(f"\nProcessing Category: {material_human_name}")
+            print(f"  Folder Found: {material_path.name}")
+            print("-" * 70)
+            
+            # Found materials are reported even when none of their phase folders exist
+            phase_counts = material_counts[material_key]
+            
+            # Iterate through phases
+            for phase_key in PHASES:
+                phase_path = phase_paths[(material_key, phase_key)]
+                
+                if not phase_path:
+                    print(f"  {phase_key.upper():15} : [NOT FOUND] Folder missing")
+                    continue
+
+                image_count = 0
+                try:
+                    images = listings[(material_key, phase_key)].result()
+                    if writer is None:
+                        image_count = images
+                    elif len(images) > PARALLEL_CAPTION_THRESHOLD:
+                        # imap keeps batch order, so the files stay deterministic
+                        tasks = [
+                            (phase_key, material_key, material_human_name, images[i:i + CAPTION_BATCH_SIZE], run_timestamp)
+                            for i in range(0, len(images), CAPTION_BATCH_SIZE)
+                        ]
+                        for data, count in pool.imap(_caption_batch, tasks):
+                            writer.write_serialized(phase_key, data, count)
+                            image_count += count
+                    else:
+                        serialize = _make_caption_serializer(phase_key, material_key, material_human_name, run_timestamp)
+                        writer.write_serialized(phase_key, b",\n".join(map(serialize, images)), len(images))
+                        image_count = len(images)
+                except Exception as e:
+                    error_msg = f"Error processing {phase_path}: {str(e)}"
+                    print(f"  ERROR: {error_msg}")
+                    errors.append(error_msg)
+                
+                print(f"  {phase_key.upper():15} : {image_count:3} images")
+                
+                if image_count == 0:
+                    print(f"    -> Checked {phase_path}")
+                    print(f"    -> [WARNING] Folder exists but contains no recognized images!")
+                
+                phase_counts[phase_key] += image_count
+
+def save_captions(statistics: Dict, write_combined: bool = True) -> None:
+    """Save statistics and (unless write_combined is False) all_initial_captions.json,
+    merged from the streamed per-phase files."""
+    if write_combined:
+        # Same order as generation: material by material, phases in PHASES order
+        captions_by_pair = defaultdict(list)
+        for phase in PHASES:
+            phase_file = get_phase_captions_file(phase)
+            if not phase_file.exists():
+                continue
+            with open(phase_file, 'rb') as f:
+                for caption in _loads(f.read()):
+                    captions_by_pair[(caption["category_id"], phase)].append(caption)
+        captions = [
+            caption
+            for material_key in MATERIALS
+            for phase in PHASES
+            for caption in captions_by_pair[(material_key, phase)]
+        ]
+        all_captions_file = FILTER_OUTPUT / "all_initial_captions.json"
+        with open(all_captions_file, 'wb') as f:
+            f.write(_dumps(captions, indent=True))
+        print(f"\n[OK] All captions saved to: {all_captions_file}")
     
-    for phase, phase_captions in captions_by_phase.items():
-        phase_file = FILTER_OUTPUT / "annotated_caption" / f"{phase}_captions.json"
-        with open(phase_file, 'w', encoding='utf-8') as f:
-            json.dump(phase_captions, f, indent=2, ensure_ascii=False)
+    markers_file = FILTER_OUTPUT / "visual_markers_index.json"
+    with open(markers_file, 'wb') as f:
+        f.write(_dumps(build_visual_markers_index(), indent=True))
+    print(f"\n[OK] Visual markers index saved to: {markers_file}")
     
     stats_file = FILTER_OUTPUT / "generation_statistics.json"
-    with open(stats_file, 'w', encoding='utf-8') as f:
-        json.dump(statistics, f, indent=2, ensure_ascii=False)
+    with open(stats_file, 'wb') as f:
+        f.write(_dumps(statistics, indent=True))
     print(f"\n[OK] Statistics saved to: {stats_file}")
 
 def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Crystallization Image Caption Generation")
+    parser.add_argument(
+        "--no-combined",
+        action="store_true",
+        help="Skip the pretty-printed all_initial_captions.json (per-phase files only)"
+    )
+    parser.add_argument(
+        "--stats-only",
+        action="store_true",
+        help="Only count images and write generation_statistics.json (no caption files)"
+    )
+    args = parser.parse_args()
+    
     try:
-        captions, statistics = process_dataset()
-        if captions:
-            save_captions(captions, statistics)
+        caption_count, statistics = process_dataset(stats_only=args.stats_only)
+        if caption_count:
+            save_captions(statistics, write_combined=not (args.no_combined or args.stats_only))
             print("\n[SUCCESS] Processing Complete!")
         else:
             print("\n[WARNING] No captions were generated.")
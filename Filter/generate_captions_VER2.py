@@ -1,15 +1,32 @@
 import json
 import os
+import sys
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass, asdict
 
+# Optional imports - vectorized growth interpolation (falls back to pure Python)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Optional imports - faster JSON (falls back to the stdlib encoder)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 BASE_PATH = Path(__file__).parent.parent
 DATASET_ROOT = BASE_PATH / "_21p1_pjirayu_Seed-Crystallization-Dataset" / "balanced_crystallization"
 FILTER_OUTPUT = BASE_PATH / "Filter"
 
-VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff'}
+# Tuple so a lower-cased name can be tested with one str.endswith call
+VALID_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
 
 
 # PROCESS STAGES MAPPING (10 Stages from industrial process)
@@ -46,7 +63,7 @@ class GrowthStageInfo:
     cumulative_growth: int  # average cumulative growth %
     growth_rate_description: str
     next_step: str
-    expected_visual_changes: List[str]
+    expected_visual_changes: Tuple[str, ...]
     process_stage_mapping: List[str]
 
 GROWTH_STAGES = {
@@ -56,11 +73,11 @@ GROWTH_STAGES = {
         cumulative_growth=0,
         growth_rate_description="No crystal growth - solution preparation phase",
         next_step="Seeding (Labile phase)",
-        expected_visual_changes=[
+        expected_visual_changes=(
             "Clear homogeneous solution",
             "Increasing concentration/viscosity",
             "No visible crystals or nuclei"
-        ],
+        ),
         process_stage_mapping=["charging", "concentration"]
     ),
     "labile": GrowthStageInfo(
@@ -69,12 +86,12 @@ GROWTH_STAGES = {
         cumulative_growth=15,
         growth_rate_description="Initial nucleation - rapid seed formation",
         next_step="Boiling (Intermediate phase)",
-        expected_visual_changes=[
+        expected_visual_changes=(
             "First appearance of crystal nuclei",
             "Tiny scattered bright specks",
             "Dark background with emerging points",
             "Rapid nucleation events"
-        ],
+        ),
         process_stage_mapping=["seeding", "graining"]
     ),
     "intermediate": GrowthStageInfo(
@@ -83,13 +100,13 @@ GROWTH_STAGES = {
         cumulative_growth=50,
         growth_rate_description="Active growth - main crystal development phase",
         next_step="Tightening (Metastable phase)",
-        expected_visual_changes=[
+        expected_visual_changes=(
             "Distinct crystal shapes forming",
             "Rectangular/prismatic structures visible",
             "Crystal size increasing",
             "Separation between individual crystals",
             "Clear geometric boundaries"
-        ],
+        ),
         process_stage_mapping=["boiling", "boiling_hold", "boiling_end"]
     ),
     "metastable": GrowthStageInfo(
@@ -98,17 +115,36 @@ GROWTH_STAGES = {
         cumulative_growth=90,
         growth_rate_description="Final growth - crystal maturation and packing",
         next_step="Batch Complete (Discharge/Cleaning)",
-        expected_visual_changes=[
+        expected_visual_changes=(
             "Dense crystal packing",
             "Interlocking mosaic pattern",
             "Fully formed faceted crystals",
             "High density coverage",
             "Little to no background visible"
-        ],
+        ),
         process_stage_mapping=["tightening", "discharge"]
     )
 }
 
+# Per-phase values derived from GROWTH_STAGES, computed once at import so
+# caption generation does a single lookup per image
+PHASE_CACHE = {
+    phase: {
+        "process_stages": info.process_stage_mapping,
+        "process_stages_str": " / ".join([s.replace("_", " ").title() for s in info.process_stage_mapping]),
+        "next_step": info.next_step,
+        "growth_stage": info,
+        # (min_pct, max_pct, span, cumulative) for growth interpolation
+        "growth": (
+            info.growth_percentage_range[0],
+            info.growth_percentage_range[1],
+            info.growth_percentage_range[1] - info.growth_percentage_range[0],
+            info.cumulative_growth
+        )
+    }
+    for phase, info in GROWTH_STAGES.items()
+}
+
 
 # MATERIAL-SPECIFIC TEMPLATES (Enhanced with growth info)
 
@@ -129,7 +165,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "The image displays a uniform, featureless amber background indicating a homogeneous liquid phase. "
                 "No crystal structures are visible. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Homogeneous amber background", "Featureless liquid", "No particles", "Clear solution"]
+            "visual_markers": ("Homogeneous amber background", "Featureless liquid", "No particles", "Clear solution")
         },
         "labile": {
             "description": "Initial seeding and nucleation phase",
@@ -139,7 +175,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "The image shows initial nucleation with sparse, minute bright specks emerging on a dark field. "
                 "These isolated points represent seed crystals forming. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Dark background", "Tiny scattered bright specks", "Initial nucleation", "Seed formation"]
+            "visual_markers": ("Dark background", "Tiny scattered bright specks", "Initial nucleation", "Seed formation")
         },
         "intermediate": {
             "description": "Active crystal growth phase",
@@ -149,7 +185,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "Distinct rectangular and prismatic crystal shapes are clearly visible with varying sizes. "
                 "Active growth is occurring with separation between structures. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Rectangular prisms", "Defined edges", "Separated crystals", "Geometric shapes", "Growing structures"]
+            "visual_markers": ("Rectangular prisms", "Defined edges", "Separated crystals", "Geometric shapes", "Growing structures")
         },
         "metastable": {
             "description": "Final crystal maturation phase",
@@ -159,7 +195,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "The frame is completely filled with a dense, interlocking mosaic of fully formed crystals. "
                 "Large, faceted structures crowd against one another. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Interlocking mosaic", "Crowded field", "High density", "No background", "Fully formed crystals"]
+            "visual_markers": ("Interlocking mosaic", "Crowded field", "High density", "No background", "Fully formed crystals")
         }
     },
     "phy_sugar_opr": {
@@ -171,7 +207,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "The image shows a smooth, light gradient background free of crystalline geometry. "
                 "Only sparse spherical artifacts (bubbles) may be present. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Smooth light background", "Spherical bubbles", "No crystal angles", "Homogeneous liquid"]
+            "visual_markers": ("Smooth light background", "Spherical bubbles", "No crystal angles", "Homogeneous liquid")
         },
         "labile": {
             "description": "Operational seeding and nucleation",
@@ -181,7 +217,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "Small, irregular dark aggregates and clumps scattered across the frame indicate nucleation onset. "
                 "These distinct clusters show solid formation beginning. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Scattered dark clumps", "Irregular aggregates", "Wide spacing", "Initial solid formation"]
+            "visual_markers": ("Scattered dark clumps", "Irregular aggregates", "Wide spacing", "Initial solid formation")
         },
         "intermediate": {
             "description": "Operational crystal growth",
@@ -191,7 +227,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "Large, translucent cubic and rectangular prisms are visible floating in solution. "
                 "Crystals exhibit sharp edges and distinct 3D volume. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Translucent cubes", "Rectangular prisms", "Sharp straight edges", "3D volume", "Crystal clarity"]
+            "visual_markers": ("Translucent cubes", "Rectangular prisms", "Sharp straight edges", "3D volume", "Crystal clarity")
         },
         "metastable": {
             "description": "Operational completion phase",
@@ -201,7 +237,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "High-density accumulation of bright, opaque crystal structures fills the view. "
                 "Crystals are heavily overlapped and packed, indicating batch completion. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Bright opaque crystals", "Dense packing", "Heavily overlapped", "Textured surface", "Full coverage"]
+            "visual_markers": ("Bright opaque crystals", "Dense packing", "Heavily overlapped", "Textured surface", "Full coverage")
         }
     },
     "vir_polymer": {
@@ -213,7 +249,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "The image displays a completely blank, uniform white field. "
                 "No artifacts or particles are present as the simulation initializes. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Blank white canvas", "Uniform background", "Empty field", "Initialization state"]
+            "visual_markers": ("Blank white canvas", "Uniform background", "Empty field", "Initialization state")
         },
         "labile": {
             "description": "Virtual nucleation initialization",
@@ -223,7 +259,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "Sparse, pixelated artifacts resembling small crosses or diamonds are scattered on the white field. "
                 "These digital seeds represent stochastic nucleation. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Pixelated crosses", "Digital noise", "Sparse distribution", "Small artifacts", "Stochastic seeds"]
+            "visual_markers": ("Pixelated crosses", "Digital noise", "Sparse distribution", "Small artifacts", "Stochastic seeds")
         },
         "intermediate": {
             "description": "Virtual growth algorithm execution",
@@ -233,7 +269,7 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "Distinct circular or globular clusters are growing outward. "
                 "The simulation shows enlarged cellular discs with white space between units. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Circular clusters", "Globular shapes", "Cellular discs", "Separated growth", "Expanding regions"]
+            "visual_markers": ("Circular clusters", "Globular shapes", "Cellular discs", "Separated growth", "Expanding regions")
         },
         "metastable": {
             "description": "Virtual simulation completion",
@@ -243,11 +279,34 @@ MATERIAL_SPECIFIC_TEMPLATES = {
                 "A complete, interlocking tessellation of irregular polygons forms a Voronoi-like pattern. "
                 "The field is fully populated with sharp boundaries. Next milestone: {next_step}."
             ),
-            "visual_markers": ["Voronoi tessellation", "Interlocking polygons", "Full coverage", "Geometric mosaic", "Complete growth"]
+            "visual_markers": ("Voronoi tessellation", "Interlocking polygons", "Full coverage", "Geometric mosaic", "Complete growth")
         }
     }
 }
 
+def _compile_percent_template(template: str, material_name: str, phase: str) -> str:
+    """Pre-substitute everything but growth_pct, leaving a single %d for it."""
+    phase_cache = PHASE_CACHE[phase]
+
+    def escape(value: str) -> str:
+        return value.replace("%", "%%")
+
+    return escape(template).format(
+        material=escape(material_name),
+        phase=escape(phase),
+        process_stages=escape(phase_cache["process_stages_str"]),
+        growth_pct="%d",
+        next_step=escape(phase_cache["next_step"])
+    )
+
+# Caption text for the known (material, phase) pairs: only growth_pct varies per
+# image, so rendering is one % substitution instead of a keyword str.format
+COMPILED_TEMPLATES = {
+    (material_key, phase): _compile_percent_template(config["template"], MATERIALS[material_key], phase)
+    for material_key, phases in MATERIAL_SPECIFIC_TEMPLATES.items()
+    for phase, config in phases.items()
+}
+
 
 # HELPER FUNCTIONS
 
@@ -260,27 +319,58 @@ def estimate_growth_percentage(phase: str, image_index: int = None, total_images
     - If image_index and total_images are provided, interpolates within the phase range
     - Otherwise, returns the average for the phase
     """
-    growth_info = GROWTH_STAGES.get(phase)
-    if not growth_info:
+    phase_cache = PHASE_CACHE.get(phase)
+    if not phase_cache:
         return {"percentage": 0, "range": (0, 0), "description": "Unknown phase"}
     
-    min_pct, max_pct = growth_info.growth_percentage_range
-    
-    if image_index is not None and total_images is not None and total_images > 0:
-        # Interpolate within the phase range based on image position
-        progress = image_index / total_images
-        estimated_pct = int(min_pct + (max_pct - min_pct) * progress)
-    else:
-        # Use cumulative average
-        estimated_pct = growth_info.cumulative_growth
-    
+    min_pct, max_pct, _, cumulative = phase_cache["growth"]
     return {
-        "percentage": estimated_pct,
+        "percentage": _interpolate_growth(phase_cache["growth"], image_index, total_images),
         "range": (min_pct, max_pct),
-        "description": growth_info.growth_rate_description,
-        "cumulative": growth_info.cumulative_growth
+        "description": phase_cache["growth_stage"].growth_rate_description,
+        "cumulative": cumulative
     }
 
+def _interpolate_growth(growth: Tuple[int, int, int, int], image_index: int = None, total_images: int = None) -> int:
+    """Growth % for an image from a PHASE_CACHE (min_pct, max_pct, span, cumulative) tuple."""
+    min_pct, _, span, cumulative = growth
+    if image_index is not None and total_images is not None and total_images > 0:
+        # Interpolate within the phase range based on image position
+        return int(min_pct + span * (image_index / total_images))
+    # Use cumulative average
+    return cumulative
+
+def get_phase_growth_percentages(phase: str, total_images: int) -> List[int]:
+    """Growth % for every image position in a phase, computed in one pass.
+    
+    Same values as _interpolate_growth(growth, idx, total_images) for each idx;
+    uses one NumPy vector op per phase when available.
+    """
+    min_pct, _, span, _ = PHASE_CACHE[phase]["growth"]
+    if NUMPY_AVAILABLE:
+        # float64 with the same operation order as the scalar path, so truncation matches
+        return (min_pct + span * (np.arange(total_images) / total_images)).astype(np.int64).tolist()
+    return [int(min_pct + span * (idx / total_images)) for idx in range(total_images)]
+
+def get_material_growth_percentages(phase_counts: Dict[str, int]) -> Dict[str, List[int]]:
+    """Growth % for every image of a material, all of its phases in one vector pass.
+    
+    phase_counts maps phase -> image count; each result list equals
+    get_phase_growth_percentages(phase, count).
+    """
+    if not NUMPY_AVAILABLE or not phase_counts:
+        return {phase: get_phase_growth_percentages(phase, count) for phase, count in phase_counts.items()}
+    
+    phases = list(phase_counts)
+    counts = np.array([phase_counts[phase] for phase in phases], dtype=np.int64)
+    growth = np.array([PHASE_CACHE[phase]["growth"] for phase in phases], dtype=np.float64)
+    # Phase id and index within its phase for each image of the concatenated phases
+    ends = np.cumsum(counts)
+    phase_ids = np.repeat(np.arange(len(phases)), counts)
+    local_index = np.arange(ends[-1]) - (ends - counts)[phase_ids]
+    pcts = (growth[phase_ids, 0] + growth[phase_ids, 2] * (local_index / counts[phase_ids])).astype(np.int64)
+    return {phase: chunk.tolist() for phase, chunk in zip(phases, np.split(pcts, ends[:-1]))}
+
 def get_process_stages_for_phase(phase: str) -> List[str]:
     """Get the process stages (from the 10 stages) that correspond to this phase."""
     growth_info = GROWTH_STAGES.get(phase)
@@ -295,36 +385,160 @@ def get_next_step(phase: str) -> str:
         return growth_info.next_step
     return "Unknown"
 
-def find_folder_insensitive(base_path: Path, target_name: str) -> Optional[Path]:
-    """Finds a folder ignoring case."""
+def find_folder_insensitive(base_path: Path, target_name: str,
+                            listing_cache: Optional[Dict[Path, Dict[str, Path]]] = None) -> Optional[Path]:
+    """Finds a folder ignoring case (exact name first; listing_cache reuses listings within one run)."""
     if not base_path.exists():
         return None
     
     exact_match = base_path / target_name
-    if exact_match.exists() and exact_match.is_dir():
+    if exact_match.is_dir():
         return exact_match
+    
+    index = listing_cache.get(base_path) if listing_cache is not None else None
+    if index is None:
+        index = {}
+        with os.scandir(base_path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    index.setdefault(entry.name.lower(), base_path / entry.name)
+        if listing_cache is not None:
+            listing_cache[base_path] = index
+    
+    return index.get(target_name.lower())
 
-    for item in base_path.iterdir():
-        if item.is_dir() and item.name.lower() == target_name.lower():
-            return item
-            
-    return None
-
-def get_images_in_folder(path: Path) -> List[Path]:
-    """Get all valid images in a folder (recursive)."""
-    images = []
+def get_images_in_folder(path: Path) -> List[str]:
+    """Get the paths (str, sorted) of all valid images in a folder (recursive)."""
     if not path or not path.exists():
-        return images
+        return []
 
-    for file_path in path.rglob("*"):
-        if file_path.is_file() and file_path.suffix.lower() in VALID_EXTENSIONS:
-            images.append(file_path)
-    return sorted(images)
+    # Iterative os.scandir walk: DirEntry type checks reuse the data from the
+    # directory read (no stat per file) and paths stay str throughout
+    images = []
+    stack = [str(path)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                if entry.name.lower().endswith(VALID_EXTENSIONS) and entry.is_file():
+                    images.append(entry.path)
+    images.sort()
+    return images
 
 
 # CAPTION GENERATION
 
 
+@dataclass(frozen=True, slots=True)
+class CaptionGroup:
+    """Caption fields shared by every image of one (material, phase) pair.
+    
+    Per-phase constants (growth range/description, expected changes, phase
+    description, visual markers) live in phases_metadata.json instead.
+    """
+    category_id: str
+    category_name: str
+    phase: str
+    process_stages: Tuple[str, ...]
+    process_stages_display: str
+    next_step: str
+    # Caption text with a single %d for growth_pct (see _compile_percent_template)
+    caption_template: str
+    # (min_pct, max_pct, span, cumulative) from PHASE_CACHE
+    growth: Tuple[int, int, int, int]
+
+# (material_key, phase, material_name) -> CaptionGroup, built on first use
+_caption_groups: Dict[Tuple[str, str, str], CaptionGroup] = {}
+
+def get_caption_group(phase: str, material_key: str, material_name: str) -> CaptionGroup:
+    """Return the shared CaptionGroup for (material, phase), building it once."""
+    key = (material_key, phase, material_name)
+    group = _caption_groups.get(key)
+    if group is not None:
+        return group
+    
+    # Get template configuration
+    if material_key not in MATERIAL_SPECIFIC_TEMPLATES:
+        visual_config = {
+            "template": "Image of {material} in {phase} phase. Growth: {growth_pct}%. Next: {next_step}.", 
+            "visual_markers": (),
+            "description": "Unknown material configuration"
+        }
+    else:
+        visual_config = MATERIAL_SPECIFIC_TEMPLATES[material_key][phase]
+    
+    # Caption template (precompiled for the known material names)
+    caption_template = COMPILED_TEMPLATES.get((material_key, phase))
+    if caption_template is None or MATERIALS.get(material_key) != material_name:
+        caption_template = _compile_percent_template(visual_config["template"], material_name, phase)
+    
+    phase_cache = PHASE_CACHE[phase]
+    group = CaptionGroup(
+        category_id=material_key,
+        category_name=material_name,
+        phase=phase,
+        process_stages=tuple(phase_cache["process_stages"]),
+        process_stages_display=phase_cache["process_stages_str"],
+        next_step=phase_cache["next_step"],
+        caption_template=caption_template,
+        growth=phase_cache["growth"]
+    )
+    _caption_groups[key] = group
+    return group
+
+@dataclass(slots=True)
+class CaptionRecord:
+    """One image's caption; everything shared by its (material, phase) lives on group."""
+    image: str
+    image_path: Optional[str]
+    estimated_percentage: int
+    initial_caption: str
+    timestamp: str
+    group: CaptionGroup
+
+    @property
+    def phase(self) -> str:
+        return self.group.phase
+
+    def to_dict(self) -> Dict:
+        """Materialize the caption output layout (done only at serialization time)."""
+        group = self.group
+        return {
+            # Basic image info
+            "image": self.image,
+            "image_path": self.image_path,
+            "category_id": group.category_id,
+            "category_name": group.category_name,
+            
+            # Phase information (per-phase constants: phases_metadata.json)
+            "phase": group.phase,
+            
+            # Process stage mapping (10 stages)
+            "process_stages": group.process_stages,
+            "process_stages_display": group.process_stages_display,
+            
+            # Crystal growth information
+            "crystal_growth": {
+                "estimated_percentage": self.estimated_percentage
+            },
+            
+            # Next step information
+            "next_step": group.next_step,
+            
+            # Caption
+            "initial_caption": self.initial_caption,
+            
+            # Verification status (for LLM cross-validation)
+            "llm_verification_status": "pending",
+            "verification_prompts_ready": True,
+            
+            # Metadata
+            "timestamp": self.timestamp,
+            "generator_version": "2.0"
+        }
+
 def generate_enhanced_caption(
     phase: str, 
     material_key: str, 
@@ -332,98 +546,127 @@ def generate_enhanced_caption(
     image_name: str,
     image_index: int = None,
     total_images_in_phase: int = None,
-    image_path: str = None
-) -> Dict:
+    image_path: str = None,
+    precomputed_pct: int = None,
+    timestamp: str = None
+) -> CaptionRecord:
     """
     Generate comprehensive caption with growth percentage and process mapping.
     
-    Returns a dictionary with:
+    Returns a CaptionRecord (to_dict() gives the output layout) with:
     - Basic image info
     - Phase and process stage information
     - Crystal growth percentage estimation
     - Next step recommendation
-    - Visual markers
     - Verification status
-    """
     
-    # Get template configuration
-    if material_key not in MATERIAL_SPECIFIC_TEMPLATES:
-        visual_config = {
-            "template": "Image of {material} in {phase} phase. Growth: {growth_pct}%. Next: {next_step}.", 
-            "visual_markers": [],
-            "description": "Unknown material configuration"
-        }
-    else:
-        visual_config = MATERIAL_SPECIFIC_TEMPLATES[material_key][phase]
+    Per-phase and per-material fields (visual markers, phase descriptions,
+    growth ranges) are not repeated per record; they live in
+    phases_metadata.json, joined on phase and category_id.
     
-    # Get growth information
-    growth_info = estimate_growth_percentage(phase, image_index, total_images_in_phase)
+    precomputed_pct (from get_phase_growth_percentages) skips the per-image
+    growth interpolation; timestamp (ISO string) is shared by a whole run and
+    defaults to now.
+    """
+    group = get_caption_group(phase, material_key, material_name)
+    if precomputed_pct is None:
+        growth_pct = _interpolate_growth(group.growth, image_index, total_images_in_phase)
+    else:
+        growth_pct = precomputed_pct
     
-    # Get process stage mapping
-    process_stages = get_process_stages_for_phase(phase)
-    process_stages_str = " / ".join([s.replace("_", " ").title() for s in process_stages])
+    return CaptionRecord(
+        image=image_name,
+        image_path=os.fspath(image_path) if image_path else None,
+        estimated_percentage=growth_pct,
+        initial_caption=group.caption_template % growth_pct,
+        timestamp=timestamp or datetime.now().isoformat(),
+        group=group
+    )
+
+
+# DATASET PROCESSING
+
+
+def _process_material(
+    material_key: str,
+    material_human_name: str,
+    material_path: Path,
+    run_timestamp: str
+) -> Tuple[Dict[str, List[CaptionRecord]], Dict[str, int], List[str], List[str]]:
+    """
+    Caption every phase folder of one material (runs in a worker process).
     
-    # Get next step
-    next_step = get_next_step(phase)
+    Returns (captions by phase, image count per found phase, log lines, errors); the
+    parent prints the log lines so output from different materials never interleaves.
+    """
+    captions = {}
+    phase_counts = {}
+    log_lines = []
+    errors = []
     
-    # Get growth stage info for additional details
-    growth_stage = GROWTH_STAGES.get(phase)
+    phase_images = {}
+    listing_cache = {}
+    for phase_key in ["unsaturated", "labile", "intermediate", "metastable"]:
+        phase_path = find_folder_insensitive(material_path, phase_key, listing_cache)
+        
+        if not phase_path:
+            log_lines.append(f"  {phase_key.upper():15} : [NOT FOUND]")
+            continue
+
+        phase_images[phase_key] = (phase_path, get_images_in_folder(phase_path))
     
-    # Format caption
-    caption = visual_config["template"].format(
-        material=material_name,
-        phase=phase,
-        process_stages=process_stages_str,
-        growth_pct=growth_info["percentage"],
-        next_step=next_step
+    # Growth % for the whole material in one pass
+    growth_by_phase = get_material_growth_percentages(
+        {phase_key: len(images) for phase_key, (_, images) in phase_images.items()}
     )
     
-    return {
-        # Basic image info
-        "image": image_name,
-        "image_path": str(image_path) if image_path else None,
-        "category_id": material_key,
-        "category_name": material_name,
+    for phase_key, (phase_path, images) in phase_images.items():
+        image_count = len(images)
         
-        # Phase information
-        "phase": phase,
-        "phase_description": visual_config.get("description", ""),
+        # Get growth info for display
+        growth_info = GROWTH_STAGES.get(phase_key)
+        growth_range = growth_info.growth_percentage_range if growth_info else (0, 0)
         
-        # Process stage mapping (10 stages)
-        "process_stages": process_stages,
-        "process_stages_display": process_stages_str,
-        
-        # Crystal growth information
-        "crystal_growth": {
-            "estimated_percentage": growth_info["percentage"],
-            "percentage_range": list(growth_info["range"]),
-            "growth_description": growth_info["description"],
-            "cumulative_growth_avg": growth_info["cumulative"]
-        },
+        log_lines.append(f"  {phase_key.upper():15} : {image_count:4} images | Growth: {growth_range[0]}-{growth_range[1]}%")
+        phase_counts[phase_key] = image_count
         
-        # Next step information
-        "next_step": next_step,
-        "expected_visual_changes": growth_stage.expected_visual_changes if growth_stage else [],
-        
-        # Caption and markers
-        "initial_caption": caption,
-        "visual_markers": visual_config["visual_markers"],
-        
-        # Verification status (for LLM cross-validation)
-        "llm_verification_status": "pending",
-        "verification_prompts_ready": True,
-        
-        # Metadata
-        "timestamp": datetime.now().isoformat(),
-        "generator_version": "2.0"
-    }
-
-
-# DATASET PROCESSING
-
+        # Generate captions
+        phase_captions = captions[phase_key] = []
+        try:
+            growth_pcts = growth_by_phase[phase_key]
+            for idx, image_file in enumerate(images):
+                caption_data = generate_enhanced_caption(
+                    phase=phase_key,
+                    material_key=material_key,
+                    material_name=material_human_name,
+                    image_name=image_file.rsplit(os.sep, 1)[-1],
+                    image_index=idx,
+                    total_images_in_phase=image_count,
+                    image_path=image_file,
+                    precomputed_pct=growth_pcts[idx],
+                    timestamp=run_timestamp
+                )
+                phase_captions.append(caption_data)
+        except Exception as e:
+            error_msg = f"Error processing {phase_path}: {str(e)}"
+            log_lines.append(f"    [ERROR] {error_msg}")
+            errors.append(error_msg)
+    
+    return captions, phase_counts, log_lines, errors
 
-def process_dataset() -> Tuple[List[Dict], Dict]:
-    """Process the entire dataset and generate captions."""
+def process_dataset(
+    max_workers: int = None
+) -> Tuple[Dict[str, List[CaptionRecord]], List[CaptionRecord], Dict]:
+    """Process the entire dataset and generate captions.
+    
+    Returns (captions by phase, all captions, statistics); both caption views
+    are filled during generation and share the same records.
+    
+    Materials are captioned in parallel worker processes (max_workers defaults
+    to one per material, capped at the CPU count). Each material's progress is
+    printed as soon as it finishes; results are merged in MATERIALS order, so
+    output files do not depend on scheduling.
+    """
     
     print("=" * 80)
     print("Crystallization Image Caption Generation (VER2)")
@@ -433,77 +676,88 @@ def process_dataset() -> Tuple[List[Dict], Dict]:
     
     if not DATASET_ROOT.exists():
         print(f"[ERROR] Dataset root not found at: {DATASET_ROOT}")
-        return [], {}
+        return {}, [], {}
 
+    captions_by_phase = {}
     all_captions = []
+    run_timestamp = datetime.now().isoformat()
     statistics = {
         "total_images": 0,
         "by_material": {},
-        "by_phase": {},
+        # Every phase is reported, including ones no material has a folder for
+        "by_phase": {phase: 0 for phase in GROWTH_STAGES},
         "growth_statistics": {},
         "errors": []
     }
     
-    for material_key, material_human_name in MATERIALS.items():
-        material_path = find_folder_insensitive(DATASET_ROOT, material_key)
-        
+    # Folder listings are reused for this run only, so a later run sees renamed folders
+    listing_cache = {}
+    material_paths = {
+        material_key: find_folder_insensitive(DATASET_ROOT, material_key, listing_cache)
+        for material_key in MATERIALS
+    }
+    jobs = [material_key for material_key, material_path in material_paths.items() if material_path]
+    max_workers = max_workers or min(len(jobs), os.cpu_count() or 1) or 1
+    
+    for material_key, material_path in material_paths.items():
         if not material_path:
             print(f"[WARNING] Folder not found: {material_key} (Skipping...)")
-            continue
-            
-        print(f"\n{'─' * 80}")
-        print(f"Processing: {material_human_name}")
-        print(f"Path: {material_path}")
-        print("─" * 80)
+    
+    results = {}
+    failure = None
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _process_material, material_key, MATERIALS[material_key],
+                material_paths[material_key], run_timestamp
+            ): material_key
+            for material_key in jobs
+        }
+        
+        # One write per material block, so blocks never interleave; a failed
+        # material is reported and re-raised once the others have been printed
+        for future in as_completed(futures):
+            material_key = futures[future]
+            try:
+                results[material_key] = future.result()
+            except Exception as e:
+                print(f"[ERROR] Processing {MATERIALS[material_key]} failed: {e}", flush=True)
+                failure = failure or e
+                continue
+            block = [
+                f"\n{'─' * 80}",
+                f"Processing: {MATERIALS[material_key]}",
+                f"Path: {material_paths[material_key]}",
+                "─" * 80,
+                *results[material_key][2]
+            ]
+            sys.stdout.write("".join(line + "\n" for line in block))
+            sys.stdout.flush()
+    
+    if failure is not None:
+        raise failure
+    
+    for material_key in jobs:
+        captions, phase_counts, _, errors = results[material_key]
         
         statistics["by_material"][material_key] = {
-            "material_name": material_human_name,
+            "material_name": MATERIALS[material_key],
             "total_images": 0,
             "by_phase": {}
         }
         
-        for phase_key in ["unsaturated", "labile", "intermediate", "metastable"]:
-            phase_path = find_folder_insensitive(material_path, phase_key)
-            
-            if not phase_path:
-                print(f"  {phase_key.upper():15} : [NOT FOUND]")
-                continue
-
-            images = get_images_in_folder(phase_path)
-            image_count = len(images)
-            
-            # Get growth info for display
-            growth_info = GROWTH_STAGES.get(phase_key)
-            growth_range = growth_info.growth_percentage_range if growth_info else (0, 0)
-            
-            print(f"  {phase_key.upper():15} : {image_count:4} images | Growth: {growth_range[0]}-{growth_range[1]}%")
-            
+        for phase_key, image_count in phase_counts.items():
             # Update statistics
             statistics["total_images"] += image_count
             statistics["by_material"][material_key]["total_images"] += image_count
             statistics["by_material"][material_key]["by_phase"][phase_key] = image_count
-            
-            if phase_key not in statistics["by_phase"]:
-                statistics["by_phase"][phase_key] = 0
             statistics["by_phase"][phase_key] += image_count
-            
-            # Generate captions
-            try:
-                for idx, image_file in enumerate(images):
-                    caption_data = generate_enhanced_caption(
-                        phase=phase_key,
-                        material_key=material_key,
-                        material_name=material_human_name,
-                        image_name=image_file.name,
-                        image_index=idx,
-                        total_images_in_phase=image_count,
-                        image_path=image_file
-                    )
-                    all_captions.append(caption_data)
-            except Exception as e:
-                error_msg = f"Error processing {phase_path}: {str(e)}"
-                print(f"    [ERROR] {error_msg}")
-                statistics["errors"].append(error_msg)
+        
+        for phase_key, phase_captions in captions.items():
+            if phase_captions:
+                captions_by_phase.setdefault(phase_key, []).extend(phase_captions)
+                all_captions.extend(phase_captions)
+        statistics["errors"].extend(errors)
 
     # Summary
     print("\n" + "=" * 80)
@@ -516,37 +770,92 @@ def process_dataset() -> Tuple[List[Dict], Dict]:
         if growth_info:
             print(f"  {phase:15} : {count:4} images | Growth: {growth_info.growth_percentage_range[0]}-{growth_info.growth_percentage_range[1]}%")
     
-    return all_captions, statistics
+    return captions_by_phase, all_captions, statistics
+
+def _dumps(obj, indent: bool = False) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes (orjson when installed)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    # Machine-consumed output: the content is ASCII, and ensure_ascii=True keeps
+    # the C encoder on its ASCII fast path (non-ASCII would just be \u-escaped)
+    return json.dumps(obj, separators=(',', ':')).encode('ascii')
+
+def _write_jsonl(path: Path, records: List[CaptionRecord]) -> None:
+    """Write caption records as JSON Lines (one compact object per line)."""
+    with open(path, 'wb') as f:
+        f.writelines(_dumps(record.to_dict()) + b"\n" for record in records)
+
+def build_phases_metadata() -> Dict:
+    """
+    Constants shared by every caption of a phase (or material + phase), written
+    once to phases_metadata.json instead of into each caption record.
+    
+    Join captions on "phase" (and "category_id" for the material entries); the
+    field names match the ones dropped from the records.
+    """
+    return {
+        "phases": {
+            phase: {
+                "percentage_range": list(info.growth_percentage_range),
+                "cumulative_growth_avg": info.cumulative_growth,
+                "growth_description": info.growth_rate_description,
+                "next_step": info.next_step,
+                "process_stages": info.process_stage_mapping,
+                "expected_visual_changes": info.expected_visual_changes
+            }
+            for phase, info in GROWTH_STAGES.items()
+        },
+        "materials": {
+            material_key: {
+                "material_name": MATERIALS.get(material_key, material_key),
+                "phases": {
+                    phase: {
+                        "phase_description": config["description"],
+                        "visual_markers": config["visual_markers"]
+                    }
+                    for phase, config in phases.items()
+                }
+            }
+            for material_key, phases in MATERIAL_SPECIFIC_TEMPLATES.items()
+        }
+    }
 
-def save_captions(captions: List[Dict], statistics: Dict) -> None:
-    """Save generated captions to JSON files."""
+def save_captions(
+    captions_by_phase: Dict[str, List[CaptionRecord]],
+    captions: List[CaptionRecord],
+    statistics: Dict
+) -> None:
+    """Save generated captions to JSON Lines files and compact statistics.
+    
+    Takes process_dataset()'s result as is: save_captions(*process_dataset()).
+    The .jsonl files are read back with load_captions/iter_captions in LLM/json_io.py.
+    """
     
     os.makedirs(FILTER_OUTPUT / "annotated_captions_VER2", exist_ok=True)
     
     # Save all captions
-    all_captions_file = FILTER_OUTPUT / "all_captions_VER2.json"
-    with open(all_captions_file, 'w', encoding='utf-8') as f:
-        json.dump(captions, f, indent=2, ensure_ascii=False)
+    all_captions_file = FILTER_OUTPUT / "all_captions_VER2.jsonl"
+    _write_jsonl(all_captions_file, captions)
     print(f"\n[OK] All captions saved to: {all_captions_file}")
     
-    # Save by phase
-    captions_by_phase = {}
-    for caption in captions:
-        phase = caption["phase"]
-        if phase not in captions_by_phase:
-            captions_by_phase[phase] = []
-        captions_by_phase[phase].append(caption)
-    
+    # Save by phase (bucketed during generation)
     for phase, phase_captions in captions_by_phase.items():
-        phase_file = FILTER_OUTPUT / "annotated_captions_VER2" / f"{phase}_captions_VER2.json"
-        with open(phase_file, 'w', encoding='utf-8') as f:
-            json.dump(phase_captions, f, indent=2, ensure_ascii=False)
+        phase_file = FILTER_OUTPUT / "annotated_captions_VER2" / f"{phase}_captions_VER2.jsonl"
+        _write_jsonl(phase_file, phase_captions)
         print(f"[OK] {phase} captions saved: {len(phase_captions)} items")
     
+    # Save per-phase constants (referenced by the caption records)
+    metadata_file = FILTER_OUTPUT / "phases_metadata.json"
+    with open(metadata_file, 'wb') as f:
+        f.write(_dumps(build_phases_metadata(), indent=True))
+    print(f"[OK] Phase metadata saved to: {metadata_file}")
+    
     # Save statistics
     stats_file = FILTER_OUTPUT / "generation_statistics_VER2.json"
-    with open(stats_file, 'w', encoding='utf-8') as f:
-        json.dump(statistics, f, indent=2, ensure_ascii=False)
+    with open(stats_file, 'wb') as f:
+        f.write(_dumps(statistics))
     print(f"[OK] Statistics saved to: {stats_file}")
 
 
@@ -555,9 +864,9 @@ def save_captions(captions: List[Dict], statistics: Dict) -> None:
 
 def main():
     try:
-        captions, statistics = process_dataset()
+        captions_by_phase, captions, statistics = process_dataset()
         if captions:
-            save_captions(captions, statistics)
+            save_captions(captions_by_phase, captions, statistics)
             print("\n" + "=" * 80)
             print("[SUCCESS] Caption Generation Complete!")
             print("=" * 80)
@@ -1,14 +1,37 @@
-import json
+from json_io import iter_json_array
 
-results = json.load(open(r'D:\user\CEIPP\LLM\llm_verification_results\verification_results.json'))
+RESULTS_FILE = r'D:\user\CEIPP\LLM\llm_verification_results\verification_results.json'
 
-# Check what makes low confidence
-low_conf = [r for r in results if r.get('verification_summary', {}).get('confidence_level') == 'low']
-print(f'Low confidence items: {len(low_conf)}')
+# Single pass: count factors in the low confidence group and keep the first 3 items
+low_conf_count = 0
+phase_true = 0
+caption_true = 0
+overall_7plus = 0
+clarity_3plus = 0
+samples = []
+
+for r in iter_json_array(RESULTS_FILE):
+    s = r.get('verification_summary', {})
+    # Check what makes low confidence
+    if s.get('confidence_level') != 'low':
+        continue
+    low_conf_count += 1
+    if s.get('phase_match') == True:
+        phase_true += 1
+    if s.get('caption_accurate') == True:
+        caption_true += 1
+    if (s.get('overall_score') or 0) >= 7:
+        overall_7plus += 1
+    if (s.get('crystal_clarity_score') or 0) >= 3:
+        clarity_3plus += 1
+    if len(samples) < 3:
+        samples.append(r)
+
+print(f'Low confidence items: {low_conf_count}')
 
 # Sample analysis
 print('\n=== Sample of low confidence items ===')
-for r in low_conf[:3]:
+for r in samples:
     s = r['verification_summary']
     print(f"Image: {r['image_name']}")
     print(f"  Phase match: {s.get('phase_match')}")
@@ -18,12 +41,7 @@ for r in low_conf[:3]:
     print()
 
 # Count factor distribution
-phase_true = sum(1 for r in low_conf if r['verification_summary'].get('phase_match') == True)
-caption_true = sum(1 for r in low_conf if r['verification_summary'].get('caption_accurate') == True)
-overall_7plus = sum(1 for r in low_conf if (r['verification_summary'].get('overall_score') or 0) >= 7)
-clarity_3plus = sum(1 for r in low_conf if (r['verification_summary'].get('crystal_clarity_score') or 0) >= 3)
-
-print(f'=== In low confidence group ({len(low_conf)}) ===')
+print(f'=== In low confidence group ({low_conf_count}) ===')
 print(f'  Phase match True: {phase_true}')
 print(f'  Caption accurate True: {caption_true}')
 print(f'  Overall score >= 7: {overall_7plus}')
@@ -31,7 +49,7 @@ print(f'  Crystal clarity >= 3: {clarity_3plus}')
 
 # Check actual responses
 print('\n=== Sample responses causing issues ===')
-for r in low_conf[:2]:
+for r in samples[:2]:
     vr = r['verification_results']
     print(f"\nImage: {r['image_name']}")
     print(f"  phase_correct response: {vr.get('phase_correct', {}).get('response')}")
@@ -11,11 +11,19 @@ Author: Copilot
 Date: 2026-01-25
 """
 
-import json
+import os
 import re
+import shutil
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Tuple, Optional
+
+from json_io import ORJSON_AVAILABLE, dumps, iter_json_array, load_json
 
 
 # Paths
@@ -25,6 +33,193 @@ NEEDS_REVIEW_FILE = LLM_PATH / "llm_verification_results" / "needs_review.json"
 STATISTICS_FILE = LLM_PATH / "llm_verification_results" / "verification_statistics.json"
 BACKUP_FOLDER = LLM_PATH / "llm_verification_results" / "backups"
 
+# Result count above which cleaning is spread over worker processes
+# (below it, pickling records to the workers costs more than it saves)
+PARALLEL_CLEAN_THRESHOLD = 5_000
+CLEAN_CHUNKSIZE = 64
+
+# Precompiled response patterns (avoids the re module cache lookup on every call)
+_RE_SCORE_1_5 = re.compile(r'\b([1-5])\b')
+_RE_DIGIT = re.compile(r'\b(\d)\b')
+_RE_1_10 = re.compile(r'\b([1-9]|10)\b')
+_RE_1_3DIG = re.compile(r'\b(\d{1,3})\b')
+_RE_ANYNUM = re.compile(r'\b(\d+)\b')
+# Garbage descriptions ("i don't know", "i can't", "???", ...) in one alternation
+_GARBAGE_COMBINED = re.compile(r"^(?:i (?:don't|have no) (?:know|idea)|if you can't|what do you|i can't|\?+$)")
+
+# Classification vocabularies
+_PHASE_VISUAL = ("clear liquid", "cloudy liquid", "small particles", "large crystals",
+                 "clear", "cloudy", "particles", "crystals")
+_PHASE_NAMES = ("unsaturated", "labile", "intermediate", "metastable")
+_CRYSTAL_COUNTS = ("none", "few", "some", "many")
+
+# Fixed-shape dicts copied per result instead of rebuilt from a literal
+_SUMMARY_TEMPLATE = {
+    "total_prompts": 0,
+    "successful_prompts": 0,
+    "valid_responses": 0,
+    "phase_match": None,
+    "caption_accurate": None,
+    "crystal_clarity_score": None,
+    "predicted_phase": None,
+    "overall_score": None,
+    "needs_review": False,
+    "confidence_level": "unknown",
+    "particles_visible": None,
+    "particle_count": None,
+    "particle_count_normalized": None,
+    "liquid_clarity": None,
+    "growth_percentage": None
+}
+_PHASE_STATS_TEMPLATE = {"total": 0, "phase_match": 0, "caption_accurate": 0, "needs_review": 0}
+
+# One pass over the response for any phase keyword (visual description or phase name)
+_PHASE_KEYWORDS_RE = re.compile("|".join(re.escape(kw) for kw in _PHASE_VISUAL + _PHASE_NAMES))
+
+# Visual keyword -> predicted phase, in precedence order (after clear liquid)
+_VISUAL_PHASE_HINTS = (
+    ("cloudy", "labile"),
+    ("particle", "intermediate"),
+    ("crystal", "metastable"),
+)
+
+# Accepted range per score prompt (other score prompts accept any number)
+_SCORE_RANGES = {
+    "crystal_clarity": (1, 5),
+    "image_quality": (1, 5),
+    "overall_verification": (1, 10),
+    "growth_estimation": (0, 100),
+}
+
+
+def _pct_tenths(part: int, whole: int) -> float:
+    """part/whole as a percentage with one decimal, computed in integers.
+    
+    Rounds half to even like round(part / whole * 100, 1); the two only differ on
+    exact .x5 ties that float error pushed the other way.
+    """
+    tenths, rem = divmod(part * 1000, whole)
+    if 2 * rem > whole or (2 * rem == whole and tenths % 2):
+        tenths += 1
+    return tenths / 10
+
+
+def _plain_int(response: str) -> Optional[int]:
+    """Return the value of a bare ASCII number like '7' (no sign or leading zero), else None."""
+    if response.isascii() and response.isdigit() and response[0] != "0":
+        return int(response)
+    return None
+
+
+def _validate_yes_no(response: str, prompt_id: str) -> Tuple[bool, Any]:
+    """Must contain 'yes' or 'no'."""
+    if "yes" in response:
+        return True, "yes"
+    elif "no" in response:
+        return True, "no"
+    return False, None
+
+
+def _validate_score(response: str, prompt_id: str) -> Tuple[bool, Any]:
+    """Extract a numeric score in the range expected for the prompt."""
+    # Fast path: a clean numeric answer needs no regex
+    n = _plain_int(response)
+    if n is not None:
+        score_range = _SCORE_RANGES.get(prompt_id)
+        if score_range is None or score_range[0] <= n <= score_range[1]:
+            return True, n
+    
+    # Different score ranges based on prompt
+    if prompt_id == "crystal_clarity" or prompt_id == "image_quality":
+        # Should be 1-5
+        numbers = _RE_SCORE_1_5.findall(response)
+        if numbers:
+            return True, int(numbers[0])
+        # Try to find any single digit
+        digits = _RE_DIGIT.findall(response)
+        if digits and 1 <= int(digits[0]) <= 5:
+            return True, int(digits[0])
+        return False, None
+    
+    elif prompt_id == "overall_verification":
+        # Should be 1-10
+        numbers = _RE_1_10.findall(response)
+        if numbers:
+            return True, int(numbers[0])
+        return False, None
+    
+    elif prompt_id == "growth_estimation":
+        # Should be 0-100
+        numbers = _RE_1_3DIG.findall(response)
+        if numbers:
+            num = int(numbers[0])
+            if 0 <= num <= 100:
+                return True, num
+        return False, None
+    
+    # Generic score validation
+    numbers = _RE_ANYNUM.findall(response)
+    if numbers:
+        return True, int(numbers[0])
+    return False, None
+
+
+def _validate_classification(response: str, prompt_id: str) -> Tuple[bool, Any]:
+    """Match the response against the vocabulary of the prompt.
+    
+    Plain str containment is used on purpose: ASCII str is stored one byte per
+    character, so `in` already runs the same C search as bytes.find without an
+    encode step.
+    """
+    if prompt_id == "phase_classification":
+        # Visual descriptions or phase names, matched in a single scan
+        if _PHASE_KEYWORDS_RE.search(response):
+            return True, response
+        return False, None
+    
+    elif prompt_id == "growth_to_next_stage":
+        if "clear" in response:
+            return True, "clear"
+        elif "cloudy" in response:
+            return True, "cloudy"
+        return False, None
+    
+    elif prompt_id == "material_type":
+        # "photo" also covers "photograph"
+        if "photo" in response:
+            return True, "photo"
+        elif "generated" in response or "computer" in response or "simulated" in response:
+            return True, "generated"
+        return False, None
+    
+    elif prompt_id == "crystal_count":
+        vc = next((v for v in _CRYSTAL_COUNTS if v in response), None)
+        if vc:
+            return True, vc
+        # Check for zero
+        if "0" in response or "no " in response or "not visible" in response:
+            return True, "none"
+        return False, None
+    
+    # Generic classification - assume valid if not empty
+    return bool(response), response
+
+
+def _validate_description(response: str, prompt_id: str) -> Tuple[bool, Any]:
+    """Descriptions are generally always valid if not empty, but check for obvious garbage."""
+    if _GARBAGE_COMBINED.match(response):
+        return False, None
+    return bool(response), response
+
+
+# response_type -> validator (unknown types are valid if not empty)
+_TYPE_VALIDATORS = {
+    "yes_no": _validate_yes_no,
+    "score": _validate_score,
+    "classification": _validate_classification,
+    "description": _validate_description,
+}
+
 
 def validate_response(response: str, response_type: str, prompt_id: str) -> Tuple[bool, Any]:
     """
@@ -41,113 +236,57 @@ def validate_response(response: str, response_type: str, prompt_id: str) -> Tupl
     if response is None:
         return False, None
     
-    response = response.strip().lower()
-    
-    if response_type == "yes_no":
-        # Must contain 'yes' or 'no'
-        if "yes" in response:
-            return True, "yes"
-        elif "no" in response:
-            return True, "no"
-        return False, None
-    
-    elif response_type == "score":
-        # Different score ranges based on prompt
-        if prompt_id == "crystal_clarity" or prompt_id == "image_quality":
-            # Should be 1-5
-            numbers = re.findall(r'\b([1-5])\b', response)
-            if numbers:
-                return True, int(numbers[0])
-            # Try to find any single digit
-            digits = re.findall(r'\b(\d)\b', response)
-            if digits and 1 <= int(digits[0]) <= 5:
-                return True, int(digits[0])
-            return False, None
-        
-        elif prompt_id == "overall_verification":
-            # Should be 1-10
-            numbers = re.findall(r'\b([1-9]|10)\b', response)
-            if numbers:
-                return True, int(numbers[0])
-            return False, None
-        
-        elif prompt_id == "growth_estimation":
-            # Should be 0-100
-            numbers = re.findall(r'\b(\d{1,3})\b', response)
-            if numbers:
-                num = int(numbers[0])
-                if 0 <= num <= 100:
-                    return True, num
-            return False, None
-        
-        # Generic score validation
-        numbers = re.findall(r'\b(\d+)\b', response)
-        if numbers:
-            return True, int(numbers[0])
-        return False, None
-    
-    elif response_type == "classification":
-        if prompt_id == "phase_classification":
-            valid_responses = ["clear liquid", "cloudy liquid", "small particles", "large crystals",
-                              "clear", "cloudy", "particles", "crystals"]
-            for valid in valid_responses:
-                if valid in response:
-                    return True, response
-            # Also check for phase names directly
-            for phase in ["unsaturated", "labile", "intermediate", "metastable"]:
-                if phase in response:
-                    return True, response
-            return False, None
-        
-        elif prompt_id == "growth_to_next_stage":
-            if "clear" in response or "cloudy" in response:
-                return True, "clear" if "clear" in response else "cloudy"
-            return False, None
-        
-        elif prompt_id == "material_type":
-            if "photo" in response or "photograph" in response:
-                return True, "photo"
-            elif "generated" in response or "computer" in response or "simulated" in response:
-                return True, "generated"
-            return False, None
-        
-        elif prompt_id == "crystal_count":
-            valid_counts = ["none", "few", "some", "many"]
-            for vc in valid_counts:
-                if vc in response:
-                    return True, vc
-            # Check for zero
-            if "0" in response or "no " in response or "not visible" in response:
-                return True, "none"
-            return False, None
-        
-        # Generic classification - assume valid if not empty
+    return _validate_normalized(response.strip().lower(), response_type, prompt_id)
+
+
+@lru_cache(maxsize=65536)
+def _validate_normalized(response: str, response_type: str, prompt_id: str) -> Tuple[bool, Any]:
+    """Validate an already stripped/lower-cased response (cached: LLM answers repeat a lot)."""
+    validator = _TYPE_VALIDATORS.get(response_type)
+    if validator is None:
         return bool(response), response
+    return validator(response, prompt_id)
+
+
+def load_results(path: Path) -> list:
+    """Load verification results (orjson when installed, else streamed with ijson, else json)."""
+    if ORJSON_AVAILABLE:
+        # Raw bytes straight to the parser, no text decoding layer
+        return load_json(path)
+    return list(iter_json_array(path))
+
+
+def save_json(path: Path, obj, indent: bool = True) -> None:
+    """Write obj as UTF-8 JSON, indented or compact (orjson when installed).
     
-    elif response_type == "description":
-        # Descriptions are generally always valid if not empty
-        # But check for obvious garbage
-        garbage_patterns = [
-            r"^i (don't|have no) (know|idea)",
-            r"^if you can't",
-            r"^what do you",
-            r"^i can't",
-            r"^\?+$",
-        ]
-        for pattern in garbage_patterns:
-            if re.match(pattern, response):
-                return False, None
-        return bool(response), response
+    The data goes to a temporary file that then replaces path, so a hard-linked
+    backup of the previous file is never overwritten in place.
+    """
+    data = dumps(obj, indent)
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def backup_file_bytes(src: Path, backup_file: Path) -> None:
+    """Preserve the original bytes of src as backup_file.
     
-    return bool(response), response
+    Hard-links when the filesystem allows it (no data is copied), otherwise
+    falls back to a file copy.
+    """
+    try:
+        os.link(src, backup_file)
+    except OSError:
+        shutil.copyfile(src, backup_file)
 
 
-def clean_verification_result(result: Dict) -> Dict:
+def clean_verification_result(result: Dict, invalid_counter: Optional[Counter] = None) -> Dict:
     """
     Clean a single verification result entry.
     
     Args:
         result: A verification result dictionary
+        invalid_counter: Optional Counter tallying invalid responses by "{prompt_id}_{response_type}"
     
     Returns:
         Cleaned result with validation status
@@ -171,6 +310,8 @@ def clean_verification_result(result: Dict) -> Dict:
             data["validation_status"] = "invalid"
             data["cleaned_value"] = None
             invalid_count += 1
+            if invalid_counter is not None:
+                invalid_counter[f"{prompt_id}_{data.get('response_type', 'unknown')}"] += 1
     
     # Update verification results
     result["verification_results"] = verification_results
@@ -180,93 +321,102 @@ def clean_verification_result(result: Dict) -> Dict:
     result["validation_stats"] = {
         "valid_responses": valid_count,
         "invalid_responses": invalid_count,
-        "validation_rate": round(valid_count / (valid_count + invalid_count) * 100, 1) if (valid_count + invalid_count) > 0 else 0
+        "validation_rate": _pct_tenths(valid_count, valid_count + invalid_count) if (valid_count + invalid_count) > 0 else 0
     }
     
     return result
 
 
+def _clean_chunk(results: list) -> Tuple[list, Counter]:
+    """Pool worker: clean a chunk of results and count their invalid response types."""
+    invalid_counter = Counter()
+    return [clean_verification_result(result, invalid_counter) for result in results], invalid_counter
+
+
+def _clean_in_workers(executor: ProcessPoolExecutor, results: list, invalid_counter: Counter):
+    """Yield cleaned results from worker processes, merging their invalid-type counts."""
+    chunks = [results[i:i + CLEAN_CHUNKSIZE] for i in range(0, len(results), CLEAN_CHUNKSIZE)]
+    for cleaned_chunk, chunk_counter in executor.map(_clean_chunk, chunks):
+        invalid_counter.update(chunk_counter)
+        yield from cleaned_chunk
+
+
+def _summary_yes(key: str):
+    """Handler storing whether the cleaned answer was 'yes' under key."""
+    def handler(summary: Dict, cleaned: Any, result: Dict) -> None:
+        summary[key] = cleaned == "yes"
+    return handler
+
+
+def _summary_int(key: str):
+    """Handler storing an integer cleaned score under key."""
+    def handler(summary: Dict, cleaned: Any, result: Dict) -> None:
+        if isinstance(cleaned, int):
+            summary[key] = cleaned
+    return handler
+
+
+def _summary_phase_classification(summary: Dict, cleaned: Any, result: Dict) -> None:
+    """Map visual descriptions to phases."""
+    if cleaned:
+        # Direct phase names take precedence, so they are checked first and the
+        # visual descriptions only when no phase is named
+        for phase in _PHASE_NAMES:
+            if phase in cleaned:
+                summary["predicted_phase"] = phase
+                return
+        if "clear liquid" in cleaned or ("clear" in cleaned and "liquid" not in cleaned):
+            summary["predicted_phase"] = "unsaturated"
+            return
+        for keyword, phase in _VISUAL_PHASE_HINTS:
+            if keyword in cleaned:
+                summary["predicted_phase"] = phase
+                return
+
+
+def _summary_liquid_clarity(summary: Dict, cleaned: Any, result: Dict) -> None:
+    summary["liquid_clarity"] = cleaned
+
+
+def _summary_crystal_count(summary: Dict, cleaned: Any, result: Dict) -> None:
+    # Only this prompt keeps the raw answer, so it is normalized here rather than per prompt
+    summary["particle_count"] = result.get("response", "").lower().strip()
+    summary["particle_count_normalized"] = cleaned
+
+
+# prompt_id -> handler updating the summary from a valid response
+_SUMMARY_HANDLERS = {
+    "phase_correct": _summary_yes("phase_match"),
+    "caption_accurate": _summary_yes("caption_accurate"),
+    "crystal_clarity": _summary_int("crystal_clarity_score"),
+    "phase_classification": _summary_phase_classification,
+    "growth_to_next_stage": _summary_liquid_clarity,
+    "overall_verification": _summary_int("overall_score"),
+    "info_correct": _summary_yes("particles_visible"),
+    "crystal_count": _summary_crystal_count,
+    "growth_estimation": _summary_int("growth_percentage"),
+}
+
+
 def recalculate_summary_clean(verification_results: Dict, expected_phase: str) -> Dict:
     """
     Recalculate summary using only valid responses.
     """
-    summary = {
-        "total_prompts": len(verification_results),
-        "successful_prompts": 0,
-        "valid_responses": 0,
-        "phase_match": None,
-        "caption_accurate": None,
-        "crystal_clarity_score": None,
-        "predicted_phase": None,
-        "overall_score": None,
-        "needs_review": False,
-        "confidence_level": "unknown",
-        "particles_visible": None,
-        "particle_count": None,
-        "particle_count_normalized": None,
-        "liquid_clarity": None,
-        "growth_percentage": None
-    }
-    
-    # Only process valid responses
-    for prompt_id, result in verification_results.items():
-        if result.get("status") != "success":
-            continue
-        
-        summary["successful_prompts"] += 1
-        
-        # Skip invalid responses
-        if result.get("validation_status") != "valid":
-            continue
-        
-        summary["valid_responses"] += 1
-        cleaned = result.get("cleaned_value")
-        response = result.get("response", "").lower().strip()
-        
-        if prompt_id == "phase_correct":
-            summary["phase_match"] = cleaned == "yes"
-        
-        elif prompt_id == "caption_accurate":
-            summary["caption_accurate"] = cleaned == "yes"
-        
-        elif prompt_id == "crystal_clarity":
-            if isinstance(cleaned, int):
-                summary["crystal_clarity_score"] = cleaned
-        
-        elif prompt_id == "phase_classification":
-            # Map visual descriptions to phases
-            if cleaned:
-                if "clear liquid" in cleaned or ("clear" in cleaned and "liquid" not in cleaned):
-                    summary["predicted_phase"] = "unsaturated"
-                elif "cloudy" in cleaned:
-                    summary["predicted_phase"] = "labile"
-                elif "small particle" in cleaned or "particle" in cleaned:
-                    summary["predicted_phase"] = "intermediate"
-                elif "large crystal" in cleaned or "crystal" in cleaned:
-                    summary["predicted_phase"] = "metastable"
-                # Direct phase names override
-                for phase in ["unsaturated", "labile", "intermediate", "metastable"]:
-                    if phase in cleaned:
-                        summary["predicted_phase"] = phase
-                        break
-        
-        elif prompt_id == "growth_to_next_stage":
-            summary["liquid_clarity"] = cleaned
-        
-        elif prompt_id == "overall_verification":
-            if isinstance(cleaned, int):
-                summary["overall_score"] = cleaned
-        
-        elif prompt_id == "info_correct":
-            summary["particles_visible"] = cleaned == "yes"
-        
-        elif prompt_id == "crystal_count":
-            summary["particle_count"] = response
-            summary["particle_count_normalized"] = cleaned
-        
-        elif prompt_id == "growth_estimation":
-            if isinstance(cleaned, int):
-                summary["growth_percentage"] = cleaned
+    summary = _SUMMARY_TEMPLATE.copy()
+    summary["total_prompts"] = len(verification_results)
+    
+    # Only process valid responses (filtered once, then counted with len)
+    successful = [(prompt_id, result) for prompt_id, result in verification_results.items()
+                  if result.get("status") == "success"]
+    valid_items = [(prompt_id, result) for prompt_id, result in successful
+                   if result.get("validation_status") == "valid"]
+    summary["successful_prompts"] = len(successful)
+    summary["valid_responses"] = len(valid_items)
+    
+    for prompt_id, result in valid_items:
+        handler = _SUMMARY_HANDLERS.get(prompt_id)
+        if handler:
+            handler(summary, result.get("cleaned_value"), result)
     
     # Calculate confidence based on VALID responses only
     confidence_points = 0
@@ -308,22 +458,24 @@ def recalculate_summary_clean(verification_results: Dict, expected_phase: str) -
         confidence_points += 1
     
     # 6. Valid response ratio bonus (1 point if >70% valid)
+    # (ratios and percentages below are compared in integers: valid/successful >= 0.7
+    # becomes valid * 10 >= successful * 7)
     max_points += 1
-    valid_ratio = summary["valid_responses"] / summary["successful_prompts"] if summary["successful_prompts"] > 0 else 0
-    if valid_ratio >= 0.7:
+    valid = summary["valid_responses"]
+    successful = summary["successful_prompts"]
+    if successful and valid * 10 >= successful * 7:
         confidence_points += 1
     
-    # Calculate confidence percentage
-    confidence_pct = (confidence_points / max_points * 100) if max_points > 0 else 0
+    # Calculate confidence percentage (max_points is at least 1 here)
     summary["confidence_points"] = confidence_points
     summary["confidence_max"] = max_points
-    summary["confidence_pct"] = round(confidence_pct, 1)
+    summary["confidence_pct"] = _pct_tenths(confidence_points, max_points)
     
     # Determine confidence level - stricter thresholds
-    if confidence_pct >= 60 and valid_ratio >= 0.6:
+    if confidence_points * 100 >= max_points * 60 and successful and valid * 10 >= successful * 6:
         summary["confidence_level"] = "high"
         summary["needs_review"] = False
-    elif confidence_pct >= 40 and valid_ratio >= 0.5:
+    elif confidence_points * 100 >= max_points * 40 and successful and valid * 10 >= successful * 5:
         summary["confidence_level"] = "medium"
         summary["needs_review"] = False
     else:
@@ -333,86 +485,92 @@ def recalculate_summary_clean(verification_results: Dict, expected_phase: str) -
     return summary
 
 
-def generate_statistics(results: list) -> Dict:
-    """Generate comprehensive statistics from cleaned results."""
-    stats = {
-        "total_processed": len(results),
-        "successful": 0,
-        "errors": 0,
-        "by_phase": {},
-        "phase_match_rate": 0,
-        "caption_accuracy_rate": 0,
-        "needs_review_count": 0,
-        "validation_summary": {
-            "total_valid_responses": 0,
-            "total_invalid_responses": 0,
-            "avg_validation_rate": 0
-        },
-        "confidence_distribution": {
-            "high": 0,
-            "medium": 0,
-            "low": 0
-        },
-        "invalid_response_types": {},
-        "cleaned_timestamp": datetime.now().isoformat()
-    }
-    
-    phase_match_count = 0
-    caption_accurate_count = 0
-    total_valid = 0
-    total_invalid = 0
-    
-    for r in results:
+@dataclass
+class StatsAccumulator:
+    """Running statistics over cleaned results, updated one result at a time."""
+    total_processed: int = 0
+    phase_match_count: int = 0
+    caption_accurate_count: int = 0
+    needs_review_count: int = 0
+    total_valid: int = 0
+    total_invalid: int = 0
+    by_phase: Dict[str, Dict[str, int]] = field(default_factory=lambda: defaultdict(_PHASE_STATS_TEMPLATE.copy))
+    confidence_distribution: Counter = field(default_factory=lambda: Counter({"high": 0, "medium": 0, "low": 0}))
+    # Filled by clean_verification_result while cleaning (see main)
+    invalid_response_types: Counter = field(default_factory=Counter)
+    
+    def update(self, r: Dict) -> None:
+        """Add one cleaned result."""
         summary = r.get("verification_summary", {})
         phase = r.get("expected_phase", "unknown")
         validation = r.get("validation_stats", {})
         
-        # Count by phase
-        if phase not in stats["by_phase"]:
-            stats["by_phase"][phase] = {"total": 0, "phase_match": 0, "caption_accurate": 0, "needs_review": 0}
+        self.total_processed += 1
         
-        stats["by_phase"][phase]["total"] += 1
+        # Count by phase
+        phase_stats = self.by_phase[phase]
+        phase_stats["total"] += 1
         
         if summary.get("phase_match"):
-            phase_match_count += 1
-            stats["by_phase"][phase]["phase_match"] += 1
+            self.phase_match_count += 1
+            phase_stats["phase_match"] += 1
         
         if summary.get("caption_accurate"):
-            caption_accurate_count += 1
-            stats["by_phase"][phase]["caption_accurate"] += 1
+            self.caption_accurate_count += 1
+            phase_stats["caption_accurate"] += 1
         
         if summary.get("needs_review"):
-            stats["needs_review_count"] += 1
-            stats["by_phase"][phase]["needs_review"] += 1
+            self.needs_review_count += 1
+            phase_stats["needs_review"] += 1
         
         # Confidence distribution
         conf = summary.get("confidence_level", "low")
-        stats["confidence_distribution"][conf] = stats["confidence_distribution"].get(conf, 0) + 1
+        self.confidence_distribution[conf] += 1
         
         # Validation stats
-        total_valid += validation.get("valid_responses", 0)
-        total_invalid += validation.get("invalid_responses", 0)
-        
-        # Track invalid response types
-        for prompt_id, data in r.get("verification_results", {}).items():
-            if data.get("validation_status") == "invalid":
-                response_type = data.get("response_type", "unknown")
-                key = f"{prompt_id}_{response_type}"
-                stats["invalid_response_types"][key] = stats["invalid_response_types"].get(key, 0) + 1
-    
-    # Calculate rates
-    stats["phase_match_rate"] = round(phase_match_count / len(results), 4) if results else 0
-    stats["caption_accuracy_rate"] = round(caption_accurate_count / len(results), 4) if results else 0
-    
-    # Validation summary
-    total_responses = total_valid + total_invalid
-    stats["validation_summary"]["total_valid_responses"] = total_valid
-    stats["validation_summary"]["total_invalid_responses"] = total_invalid
-    stats["validation_summary"]["avg_validation_rate"] = round(total_valid / total_responses * 100, 1) if total_responses > 0 else 0
-    
-    stats["successful"] = len(results) - stats["needs_review_count"]
+        self.total_valid += validation.get("valid_responses", 0)
+        self.total_invalid += validation.get("invalid_responses", 0)
+    
+    def finalize(self) -> Dict:
+        """Build the statistics dict written to verification_statistics.json."""
+        total = self.total_processed
+        total_responses = self.total_valid + self.total_invalid
+        return {
+            "total_processed": total,
+            "successful": total - self.needs_review_count,
+            "errors": 0,
+            "by_phase": dict(self.by_phase),
+            "phase_match_rate": round(self.phase_match_count / total, 4) if total else 0,
+            "caption_accuracy_rate": round(self.caption_accurate_count / total, 4) if total else 0,
+            "needs_review_count": self.needs_review_count,
+            "validation_summary": {
+                "total_valid_responses": self.total_valid,
+                "total_invalid_responses": self.total_invalid,
+                "avg_validation_rate": _pct_tenths(self.total_valid, total_responses) if total_responses > 0 else 0
+            },
+            "confidence_distribution": dict(self.confidence_distribution),
+            "invalid_response_types": dict(self.invalid_response_types),
+            "cleaned_timestamp": datetime.now().isoformat()
+        }
+
+
+def generate_statistics(results: list, invalid_counter: Optional[Counter] = None) -> Dict:
+    """Generate comprehensive statistics from cleaned results.
     
-    return stats
+    invalid_response_types comes from invalid_counter when the caller tallied it
+    with clean_verification_result, otherwise it is counted from the results.
+    """
+    acc = StatsAccumulator()
+    if invalid_counter is not None:
+        acc.invalid_response_types = invalid_counter
+    for r in results:
+        acc.update(r)
+        if invalid_counter is None:
+            # Track invalid response types
+            for prompt_id, data in r.get("verification_results", {}).items():
+                if data.get("validation_status") == "invalid":
+                    acc.invalid_response_types[f"{prompt_id}_{data.get('response_type', 'unknown')}"] += 1
+    return acc.finalize()
 
 
 def main():
@@ -431,38 +589,50 @@ def main():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     print(f"\n[1/5] Loading verification results...")
-    with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
-        results = json.load(f)
+    results = load_results(RESULTS_FILE)
     print(f"       Loaded {len(results)} results")
     
     # Backup original
     print(f"\n[2/5] Creating backup...")
     backup_file = BACKUP_FOLDER / f"verification_results_backup_{timestamp}.json"
-    with open(backup_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    # Original bytes, no re-serialization
+    backup_file_bytes(RESULTS_FILE, backup_file)
     print(f"       Backup saved to: {backup_file.name}")
     
     # Clean results
     print(f"\n[3/5] Cleaning and validating responses...")
+    # One pass: clean each result and fold it into statistics, needs_review
+    # and the invalid-response examples while it is at hand
     cleaned_results = []
+    needs_review = []
     invalid_examples = []
+    acc = StatsAccumulator()
     
-    for i, result in enumerate(results):
-        cleaned = clean_verification_result(result)
-        cleaned_results.append(cleaned)
+    with (ProcessPoolExecutor() if len(results) > PARALLEL_CLEAN_THRESHOLD else nullcontext()) as executor:
+        if executor:
+            cleaned_iter = _clean_in_workers(executor, results, acc.invalid_response_types)
+        else:
+            cleaned_iter = (clean_verification_result(result, acc.invalid_response_types) for result in results)
         
-        # Collect examples of invalid responses (first 5)
-        if len(invalid_examples) < 5:
-            for prompt_id, data in cleaned.get("verification_results", {}).items():
-                if data.get("validation_status") == "invalid":
-                    invalid_examples.append({
-                        "image": cleaned.get("image_name"),
-                        "prompt_id": prompt_id,
-                        "prompt": data.get("prompt", "")[:50] + "...",
-                        "response": data.get("response", ""),
-                        "response_type": data.get("response_type")
-                    })
-                    break
+        for cleaned in cleaned_iter:
+            cleaned_results.append(cleaned)
+            acc.update(cleaned)
+            
+            if cleaned.get("verification_summary", {}).get("needs_review"):
+                needs_review.append(cleaned)
+            
+            # Collect examples of invalid responses (first 5)
+            if len(invalid_examples) < 5:
+                for prompt_id, data in cleaned.get("verification_results", {}).items():
+                    if data.get("validation_status") == "invalid":
+                        invalid_examples.append({
+                            "image": cleaned.get("image_name"),
+                            "prompt_id": prompt_id,
+                            "prompt": data.get("prompt", "")[:50] + "...",
+                            "response": data.get("response", ""),
+                            "response_type": data.get("response_type")
+                        })
+                        break
     
     # Show some invalid examples
     if invalid_examples:
@@ -472,24 +642,19 @@ def main():
     
     # Generate statistics
     print(f"\n[4/5] Generating statistics...")
-    stats = generate_statistics(cleaned_results)
-    
-    # Filter needs_review
-    needs_review = [r for r in cleaned_results if r.get("verification_summary", {}).get("needs_review")]
+    stats = acc.finalize()
     
     # Save cleaned results
     print(f"\n[5/5] Saving cleaned files...")
     
-    with open(RESULTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(cleaned_results, f, indent=2, ensure_ascii=False)
+    # Machine-consumed, so written compact; the smaller review/statistics files stay indented
+    save_json(RESULTS_FILE, cleaned_results, indent=False)
     print(f"       Updated: verification_results.json")
     
-    with open(NEEDS_REVIEW_FILE, 'w', encoding='utf-8') as f:
-        json.dump(needs_review, f, indent=2, ensure_ascii=False)
+    save_json(NEEDS_REVIEW_FILE, needs_review)
     print(f"       Updated: needs_review.json ({len(needs_review)} items)")
     
-    with open(STATISTICS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(stats, f, indent=2, ensure_ascii=False)
+    save_json(STATISTICS_FILE, stats)
     print(f"       Updated: verification_statistics.json")
     
     # Print summary
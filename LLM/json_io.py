@@ -0,0 +1,102 @@
+"""
+JSON helpers shared by the LLM scripts.
+
+Uses orjson for parsing/serializing and ijson for streaming large arrays when
+they are installed, with json module fallbacks that produce the same data.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# Optional imports - faster JSON (falls back to the json module)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Optional imports - stream large JSON files (falls back to loading the whole file)
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+
+def loads(data):
+    """Parse JSON bytes or str (orjson when installed)."""
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+
+
+def dumps(obj, indent: bool = True) -> bytes:
+    """Serialize obj to UTF-8 JSON, indented or compact (orjson when installed)."""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def load_json(path):
+    """Read a JSON file (orjson when installed)."""
+    return loads(Path(path).read_bytes())
+
+
+def dump_json(obj, path) -> None:
+    """Write obj as indented UTF-8 JSON in a single write (orjson when installed)."""
+    Path(path).write_bytes(dumps(obj))
+
+
+def array_item_json(obj) -> bytes:
+    """obj as one element of an indented JSON array (the bytes dump_json writes for it)."""
+    # JSON strings never contain raw newlines, so this only indents the layout
+    return b"  " + dumps(obj).replace(b"\n", b"\n  ")
+
+
+def json_line(obj) -> bytes:
+    """Serialize obj as one JSON Lines record."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+def iter_json_array(path) -> Iterator:
+    """Yield the items of a JSON array file one at a time (streamed with ijson when installed)."""
+    if IJSON_AVAILABLE:
+        with open(path, 'rb') as f:
+            yield from ijson.items(f, 'item', use_float=True)
+    else:
+        yield from load_json(path)
+
+
+def count_json_items(path) -> Optional[int]:
+    """Length of a JSON array file, None for other JSON (streamed with ijson when installed)."""
+    if not IJSON_AVAILABLE:
+        data = load_json(path)
+        return len(data) if isinstance(data, list) else None
+    with open(path, 'rb') as f:
+        first = next(ijson.parse(f), None)
+        if first is None or first[1] != 'start_array':
+            return None
+        f.seek(0)
+        return sum(1 for _ in ijson.items(f, 'item', use_float=True))
+
+
+def iter_captions(path) -> Iterator[Dict]:
+    """Yield caption records one at a time from JSON Lines (or a legacy JSON array)."""
+    if Path(path).suffix == '.jsonl':
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+    else:
+        yield from iter_json_array(path)
+
+
+def load_captions(path) -> List[Dict]:
+    """Load captions from JSON Lines (.jsonl, VER2 output) or a legacy JSON array."""
+    if Path(path).suffix == '.jsonl':
+        return list(iter_captions(path))
+    return load_json(path)
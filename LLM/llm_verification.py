@@ -1,13 +1,21 @@
-import json
 import os
+import queue
+import re
+import sys
+import threading
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
 from PIL import Image
 import torch
+from torch.utils.data import DataLoader, Dataset
 from tqdm import tqdm
 
+from json_io import dump_json, json_line, load_captions, load_json, loads
+
 # Optional imports - will check availability
 try:
     from transformers import Blip2Processor, Blip2ForConditionalGeneration
@@ -16,6 +24,19 @@ except ImportError:
     BLIP2_AVAILABLE = False
     print("[WARNING] transformers not installed. Run: pip install transformers")
 
+try:
+    import flash_attn  # noqa: F401
+    FLASH_ATTN_AVAILABLE = True
+except ImportError:
+    FLASH_ATTN_AVAILABLE = False
+
+try:
+    import torchvision
+    from torchvision.transforms import v2
+    TORCHVISION_AVAILABLE = True
+except ImportError:
+    TORCHVISION_AVAILABLE = False
+
 
 # CONFIGURATION
 
@@ -23,7 +44,7 @@ BASE_PATH = Path(__file__).parent.parent  # CEIPP folder
 LLM_PATH = Path(__file__).parent  # LLM folder
 DATASET_ROOT = BASE_PATH / "_21p1_pjirayu_Seed-Crystallization-Dataset" / "balanced_crystallization"
 FILTER_OUTPUT = BASE_PATH / "Filter"
-CAPTIONS_FILE = FILTER_OUTPUT / "all_captions_VER2.json"  # Captions from Filter folder
+CAPTIONS_FILE = FILTER_OUTPUT / "all_captions_VER2.jsonl"  # Captions from Filter folder (JSON Lines)
 VERIFICATION_OUTPUT = LLM_PATH / "llm_verification_results"  # Output to LLM folder
 
 # Model configurations - Using BLIP-2 Flan-T5 
@@ -49,6 +70,13 @@ MODEL_CONFIGS = {
         "load_in_8bit": True,
         "is_t5": True
     },
+    "blip2_flan_nf4": {
+        "name": "Salesforce/blip2-flan-t5-xl",
+        "description": "BLIP-2 Flan-T5-XL with 4-bit NF4 language model (Requires bitsandbytes, ~3GB VRAM, use --batch-size 16+ on 6GB)",
+        "vram_required": 3,
+        "load_in_4bit": True,
+        "is_t5": True
+    },
     "blip2_flan_xxl": {
         "name": "Salesforce/blip2-flan-t5-xxl",
         "description": "BLIP-2 with FLAN-T5-XXL (Most accurate, needs 16GB+ VRAM)",
@@ -57,15 +85,80 @@ MODEL_CONFIGS = {
     }
 }
 
+# Images verified per generate call (each contributes one row per prompt)
+DEFAULT_BATCH_SIZE = 4
+
+# Generation settings for BLIP-2 Flan-T5 (encoder-decoder, no echo issue)
+GENERATION_KWARGS = {
+    "min_new_tokens": 1,
+    "do_sample": False,  # Greedy for more consistent answers
+    "num_beams": 3,  # Beam search for better quality
+    "length_penalty": 1.0,
+    "repetition_penalty": 2.0,  # Prevent repetition (1.0 = no penalty)
+    "no_repeat_ngram_size": 3,  # Never repeat 3-grams
+    "early_stopping": True,  # Stop when all beams are done
+}
+
+# Short answers decode greedily in a few steps; beam search only pays off for descriptions
+RESPONSE_TYPE_GENERATION = {
+    "yes_no": {"max_new_tokens": 2, "num_beams": 1, "early_stopping": False},
+    "score": {"max_new_tokens": 3, "num_beams": 1, "early_stopping": False},
+    "classification": {"max_new_tokens": 5, "num_beams": 1, "early_stopping": False},
+}
+
+# Let the caching allocator grow segments instead of fragmenting (applied by the
+# command-line entry points, must be set before CUDA init)
+CUDA_ALLOC_CONF = "expandable_segments:True,max_split_size_mb:128"
+
+# Model server (--mode serve) keeps the model loaded between runs
+SERVE_PORT = 6006
+SERVE_AUTHKEY_ENV = "CEIPP_SERVE_AUTHKEY"  # hex key, overrides the key file
+SERVE_AUTHKEY_DIR = Path.home() / ".ceipp"
+
+# Background workers that decode and preprocess the next batches while the GPU runs
+LOADER_WORKERS = 4
+LOADER_PREFETCH = 2
+
+# Write buffer for the JSONL results log (flushed at checkpoints)
+LOG_BUFFER_SIZE = 1 << 20
+
+# With --compile, prompts are padded to a multiple of this length so the CUDA graphs
+# recorded by torch.compile (mode="reduce-overhead") see only a few input shapes
+COMPILE_PAD_MULTIPLE = 16
+
 # PROMPTS
 
-@dataclass
+# Slotted prompts where supported (dataclass slots need Python 3.10+)
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(frozen=True, **_DATACLASS_SLOTS)
 class VerificationPrompt:
     """Structure for verification prompts"""
     id: str
     prompt: str
     expected_response_type: str  # 'yes_no', 'classification', 'description', 'score'
     phase_specific: bool = False
+    allowed_answers: Tuple[str, ...] = ()  # When set, decoding is restricted to these answers
+    has_placeholders: bool = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Prompts without placeholders (or brace escapes) are used as-is, skipping formatting per image
+        object.__setattr__(self, "has_placeholders", "{" in self.prompt or "}" in self.prompt)
+    
+    def render(self, fields: Dict) -> str:
+        """Fill in the prompt placeholders from a dict of caption fields (built once per image)."""
+        return self.prompt.format_map(fields) if self.has_placeholders else self.prompt
+
+# Score extraction for the summary (first 1-5 clarity score, first 1-10 rating)
+_SCORE_RE = re.compile(r'\b([1-5])\b')
+_RATING_RE = re.compile(r'\b([1-9]|10)\b')
+
+# Phase names in the order they take precedence when a response mentions several
+_PHASE_NAMES = ("unsaturated", "labile", "intermediate", "metastable")
+
+# Answer vocabularies for constrained decoding
+YES_NO_ANSWERS = ("yes", "no")
+SCORE_1_5_ANSWERS = tuple(str(n) for n in range(1, 6))
 
 # Prompts optimized for BLIP-2 Flan-T5 (instruction-tuned, follows Q&A format well)
 # Flan-T5 is trained to follow instructions and answer questions directly
@@ -76,35 +169,40 @@ VERIFICATION_PROMPTS = [
         id="phase_correct",
         prompt="Is this image showing a {expected_phase} state? Answer yes or no.",
         expected_response_type="yes_no",
-        phase_specific=True
+        phase_specific=True,
+        allowed_answers=YES_NO_ANSWERS
     ),
     
     # 2. Image type verification - More general question
     VerificationPrompt(
         id="caption_accurate",
         prompt="Is this a microscopic or scientific image? Answer yes or no.",
-        expected_response_type="yes_no"
+        expected_response_type="yes_no",
+        allowed_answers=YES_NO_ANSWERS
     ),
     
     # 3. Particle/crystal visibility check
     VerificationPrompt(
         id="info_correct",
         prompt="Are there visible particles or crystals in this image? Answer yes or no.",
-        expected_response_type="yes_no"
+        expected_response_type="yes_no",
+        allowed_answers=YES_NO_ANSWERS
     ),
     
     # 4. Particle clarity - Force number answer
     VerificationPrompt(
         id="crystal_clarity",
         prompt="How clear are the particles? Answer only 1, 2, 3, 4, or 5.",
-        expected_response_type="score"
+        expected_response_type="score",
+        allowed_answers=SCORE_1_5_ANSWERS
     ),
     
     # 5. Phase classification - Visual description based
     VerificationPrompt(
         id="phase_classification",
         prompt="Is this image: clear liquid, cloudy liquid, small particles, or large crystals? Answer one.",
-        expected_response_type="classification"
+        expected_response_type="classification",
+        allowed_answers=("clear liquid", "cloudy liquid", "small particles", "large crystals")
     ),
     
     # 6. Visual description - Open ended
@@ -118,21 +216,24 @@ VERIFICATION_PROMPTS = [
     VerificationPrompt(
         id="growth_estimation",
         prompt="What percentage of the image has visible particles? Answer a number 0 to 100.",
-        expected_response_type="score"
+        expected_response_type="score",
+        allowed_answers=tuple(str(n) for n in range(101))
     ),
     
     # 8. Clarity level
     VerificationPrompt(
         id="growth_to_next_stage",
         prompt="Is the liquid clear or cloudy? Answer clear or cloudy.",
-        expected_response_type="classification"
+        expected_response_type="classification",
+        allowed_answers=("clear", "cloudy")
     ),
     
     # 9. Image quality - Force number
     VerificationPrompt(
         id="image_quality",
         prompt="Rate image sharpness. Answer only 1, 2, 3, 4, or 5.",
-        expected_response_type="score"
+        expected_response_type="score",
+        allowed_answers=SCORE_1_5_ANSWERS
     ),
     
     # 10. Content description
@@ -146,24 +247,34 @@ VERIFICATION_PROMPTS = [
     VerificationPrompt(
         id="material_type",
         prompt="Is this a photograph or computer generated? Answer photo or generated.",
-        expected_response_type="classification"
+        expected_response_type="classification",
+        allowed_answers=("photo", "generated")
     ),
     
     # 12. Particle count estimation
     VerificationPrompt(
         id="crystal_count",
         prompt="How many particles are visible? Answer none, few, some, or many.",
-        expected_response_type="classification"
+        expected_response_type="classification",
+        allowed_answers=("none", "few", "some", "many")
     ),
     
     # 13. Overall quality score - Force number
     VerificationPrompt(
         id="overall_verification",
         prompt="Rate this image quality from 1 to 10. Answer only the number.",
-        expected_response_type="score"
+        expected_response_type="score",
+        allowed_answers=tuple(str(n) for n in range(1, 11))
     )
 ]
 
+def select_prompts(prompts_to_use: List[str] = None) -> List[VerificationPrompt]:
+    """Return the prompt configs for the given prompt IDs (None = all prompts)."""
+    if not prompts_to_use:
+        return VERIFICATION_PROMPTS
+    wanted = set(prompts_to_use)
+    return [p for p in VERIFICATION_PROMPTS if p.id in wanted]
+
 # LLM VERIFICATION CLASS
 
 class CrystallizationVerifier:
@@ -171,18 +282,25 @@ class CrystallizationVerifier:
     Vision-Language Model based verifier for crystallization captions.
     """
     
-    def __init__(self, model_name: str = "blip2_opt", device: str = None):
+    def __init__(self, model_name: str = "blip2_opt", device: str = None, compile_decoder: bool = False):
         """
         Initialize the verifier with specified model.
         
         Args:
             model_name: Key from MODEL_CONFIGS or full HuggingFace model path
             device: 'cuda', 'cpu', or None for auto-detection
+            compile_decoder: Compile the language model forward with torch.compile (CUDA only)
         """
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.model = None
         self.processor = None
         self.model_name = model_name
+        self.compile_decoder = compile_decoder
+        self._answer_tries = {}
+        self._token_cache = {}  # prompt text -> token ids / attention mask (unpadded)
+        self._input_dtype = torch.float32  # dtype for float model inputs, set by load_model
+        self._device_transform = None  # GPU resize + normalize, set by load_model when available
+        self._pad_multiple = None  # prompt padding multiple, set by load_model when compiling
         
         print(f"[INFO] Using device: {self.device}")
         
@@ -197,6 +315,7 @@ class CrystallizationVerifier:
         model_config = MODEL_CONFIGS.get(self.model_name, {})
         model_path = model_config.get("name", self.model_name)
         use_8bit = model_config.get("load_in_8bit", False)
+        use_4bit = model_config.get("load_in_4bit", False)
         low_memory = model_config.get("low_memory", False)
         use_float16 = model_config.get("use_float16", True)
         
@@ -204,6 +323,8 @@ class CrystallizationVerifier:
         print(f"[INFO] Model config: {self.model_name}")
         if use_8bit:
             print(f"[INFO] Using 8-bit quantization")
+        if use_4bit:
+            print(f"[INFO] Using 4-bit NF4 quantization for the language model")
         if low_memory:
             print(f"[INFO] Using low memory mode (optimized for 6GB VRAM)")
         
@@ -222,81 +343,112 @@ class CrystallizationVerifier:
                 print("[INFO] Downloading processor...")
                 self.processor = Blip2Processor.from_pretrained(model_path)
             
-            # Check if 8-bit loading is requested
-            if use_8bit:
+            # Check if 8-bit or 4-bit loading is requested
+            if use_8bit or use_4bit:
+                mode = "8-bit" if use_8bit else "4-bit NF4"
                 try:
                     from transformers import BitsAndBytesConfig
-                    quantization_config = BitsAndBytesConfig(load_in_8bit=True)
-                    try:
-                        self.model = Blip2ForConditionalGeneration.from_pretrained(
-                            model_path,
-                            quantization_config=quantization_config,
-                            device_map="auto",
-                            local_files_only=True
-                        )
-                        print("[INFO] Using cached model (8-bit)")
-                    except Exception:
-                        print("[INFO] Downloading model (8-bit)...")
-                        self.model = Blip2ForConditionalGeneration.from_pretrained(
-                            model_path,
-                            quantization_config=quantization_config,
-                            device_map="auto"
+                    load_kwargs = {}
+                    if use_8bit:
+                        quantization_config = BitsAndBytesConfig(load_in_8bit=True)
+                    else:
+                        # Only the language model is quantized; vision tower and Q-Former stay fp16
+                        quantization_config = BitsAndBytesConfig(
+                            load_in_4bit=True,
+                            bnb_4bit_quant_type="nf4",
+                            bnb_4bit_compute_dtype=torch.float16,
+                            bnb_4bit_use_double_quant=True,
+                            llm_int8_skip_modules=["vision_model", "qformer", "language_projection"]
                         )
+                        load_kwargs["torch_dtype"] = torch.float16
+                    self.model = self._load_pretrained(
+                        model_path,
+                        f" ({mode})",
+                        half_precision=True,
+                        quantization_config=quantization_config,
+                        device_map="auto",
+                        **load_kwargs
+                    )
                 except ImportError:
                     print("[WARNING] bitsandbytes not installed. Install with: pip install bitsandbytes")
                     print("[INFO] Falling back to float16 mode")
-                    use_8bit = False
+                    use_8bit = use_4bit = False
                     low_memory = True  # Try low memory mode instead
                 except Exception as e:
-                    print(f"[WARNING] 8-bit loading failed: {e}")
+                    print(f"[WARNING] {mode} loading failed: {e}")
                     print("[INFO] Falling back to float16 mode")
-                    use_8bit = False
+                    use_8bit = use_4bit = False
                     low_memory = True
             
             # Low memory mode for 6GB VRAM (using float16 + memory optimization)
-            if not use_8bit and low_memory and self.device == "cuda":
+            quantized = use_8bit or use_4bit
+            if not quantized and low_memory and self.device == "cuda":
                 print("[INFO] Loading with float16 + low memory optimization...")
-                try:
-                    self.model = Blip2ForConditionalGeneration.from_pretrained(
-                        model_path,
-                        torch_dtype=torch.float16,
-                        device_map="auto",
-                        low_cpu_mem_usage=True,
-                        local_files_only=True
-                    )
-                    print("[INFO] Using cached model (float16 optimized)")
-                except Exception:
-                    print("[INFO] Downloading model (float16 optimized)...")
-                    self.model = Blip2ForConditionalGeneration.from_pretrained(
-                        model_path,
-                        torch_dtype=torch.float16,
-                        device_map="auto",
-                        low_cpu_mem_usage=True
-                    )
-            elif not use_8bit:
+                self.model = self._load_pretrained(
+                    model_path,
+                    " (float16 optimized)",
+                    half_precision=True,
+                    torch_dtype=torch.float16,
+                    device_map="auto",
+                    low_cpu_mem_usage=True
+                )
+            elif not quantized:
                 # Standard loading
                 dtype = torch.float16 if (self.device == "cuda" and use_float16) else torch.float32
-                try:
-                    self.model = Blip2ForConditionalGeneration.from_pretrained(
-                        model_path,
-                        torch_dtype=dtype,
-                        device_map="auto" if self.device == "cuda" else None,
-                        local_files_only=True
-                    )
-                    print("[INFO] Using cached model")
-                except Exception:
-                    print("[INFO] Downloading model...")
-                    self.model = Blip2ForConditionalGeneration.from_pretrained(
-                        model_path,
-                        torch_dtype=dtype,
-                        device_map="auto" if self.device == "cuda" else None
-                    )
+                self.model = self._load_pretrained(
+                    model_path,
+                    "",
+                    half_precision=dtype == torch.float16,
+                    torch_dtype=dtype,
+                    device_map="auto" if self.device == "cuda" else None
+                )
             
-            if self.device == "cpu" and not use_8bit:
+            if self.device == "cpu" and not quantized:
                 self.model = self.model.to(self.device)
             
-            # Set model to eval mode
+            # Set model to eval mode (generation runs under torch.inference_mode())
             self.model.eval()
+            # Keep the decoder KV cache on for multi-token generation
+            self.model.language_model.config.use_cache = True
+            
+            # Float inputs are cast to the dtype the weights were loaded in
+            half_precision = quantized or low_memory or use_float16
+            self._input_dtype = torch.float16 if (self.device == "cuda" and half_precision) else torch.float32
+            
+            # Resize and normalize on the GPU, matching the processor's image settings
+            if TORCHVISION_AVAILABLE and self.device == "cuda":
+                image_processor = self.processor.image_processor
+                self._device_transform = v2.Compose([
+                    v2.Resize(
+                        (image_processor.size["height"], image_processor.size["width"]),
+                        interpolation=v2.InterpolationMode.BICUBIC,
+                        antialias=True
+                    ),
+                    v2.ToDtype(self._input_dtype, scale=True),
+                    v2.Normalize(image_processor.image_mean, image_processor.image_std)
+                ])
+                print("[INFO] Decoding and resizing images on the GPU")
+            print(f"[INFO] Attention implementation: {self.model.language_model.config._attn_implementation}")
+            
+            # Pre-tokenize the answer vocabularies used for constrained decoding and the
+            # fixed prompts (phase-specific prompts are cached on first use)
+            for prompt_config in VERIFICATION_PROMPTS:
+                if prompt_config.allowed_answers:
+                    self._answer_trie(prompt_config.allowed_answers)
+                if not prompt_config.phase_specific:
+                    self._tokenize_prompts([prompt_config.prompt])
+            
+            # Compile the decoder forward that generate() calls on every step; reduce-overhead
+            # replays it as CUDA graphs, which needs fixed shapes from step to step
+            if self.compile_decoder and self.device == "cuda" and hasattr(torch, "compile"):
+                language_model = self.model.language_model
+                if getattr(language_model, "_supports_static_cache", False):
+                    # Preallocated KV cache instead of one that grows every decode step
+                    language_model.generation_config.cache_implementation = "static"
+                    print("[INFO] Using static KV cache for compiled decoding")
+                self._pad_multiple = COMPILE_PAD_MULTIPLE
+                language_model.forward = torch.compile(language_model.forward, mode="reduce-overhead")
+                print("[INFO] Language model compiled with torch.compile (first batches will be slow)")
             
             # Clear cache after loading
             if self.device == "cuda":
@@ -322,46 +474,341 @@ class CrystallizationVerifier:
         self, 
         image: Image.Image, 
         prompt: str, 
-        max_new_tokens: int = 50
+        max_new_tokens: int = 50,
+        response_type: Optional[str] = None
     ) -> str:
         """
         Generate response from the model for a given image and prompt.
         Flan-T5 is encoder-decoder so it outputs only the answer (no echo).
         """
+        return self.generate_responses(image, [prompt], max_new_tokens, [response_type])[0]
+    
+    def generate_responses(
+        self, 
+        image: Image.Image, 
+        prompts: List[str], 
+        max_new_tokens: int = 50,
+        response_types: Optional[List[Optional[str]]] = None
+    ) -> List[str]:
+        """Generate responses for several prompts on the same image in one batched call."""
+        return self.generate_batch(
+            [image], [prompts], max_new_tokens,
+            response_types=[response_types] if response_types else None
+        )[0]
+    
+    def generate_batch(
+        self, 
+        images: Optional[List[Image.Image]], 
+        prompts_per_image: List[List[str]], 
+        max_new_tokens: int = 50,
+        pixel_values: Optional[torch.Tensor] = None,
+        response_types: Optional[List[List[Optional[str]]]] = None,
+        allowed_answers: Optional[List[List[Tuple[str, ...]]]] = None
+    ) -> List[List[str]]:
+        """
+        Generate responses for several images, each with its own prompts. Each image
+        is preprocessed and run through the vision encoder and Q-Former once, and its
+        query embeddings are reused for each of its prompts; prompts sharing a response
+        type go through one generate call with the settings from
+        RESPONSE_TYPE_GENERATION. Prompts with allowed answers can only decode one of
+        those answers.
+        
+        Args:
+            images: Images to preprocess here (ignored when pixel_values is given)
+            prompts_per_image: Prompts for each image
+            max_new_tokens: Generation length limit for untyped and description prompts
+            pixel_values: Already preprocessed images, one row per image
+            response_types: Expected response type of each prompt, per image
+            allowed_answers: Answer vocabulary of each prompt, per image (empty = free text)
+        
+        Returns:
+            One list of responses per image, in prompt order
+        """
         if self.model is None:
             raise RuntimeError("Model not loaded. Call load_model() first.")
         
-        # Prepare inputs
-        inputs = self.processor(
-            images=image, 
-            text=prompt, 
-            return_tensors="pt"
-        )
+        if pixel_values is None:
+            pixel_values = self.processor.image_processor(images=images, return_tensors="pt")["pixel_values"]
         
-        # Move to device
-        if self.device == "cuda":
-            inputs = {k: v.to(self.device, dtype=torch.float16) if v.dtype == torch.float32 else v.to(self.device) 
-                     for k, v in inputs.items()}
+        pixel_values = self._move_inputs({"pixel_values": pixel_values})["pixel_values"]
+        
+        # Flatten to (image row, prompt, response type) and group rows by response type
+        counts = [len(prompts) for prompts in prompts_per_image]
+        flat_prompts = [prompt for prompts in prompts_per_image for prompt in prompts]
+        owners = [i for i, count in enumerate(counts) for _ in range(count)]
+        if response_types is None:
+            flat_types = [None] * len(flat_prompts)
         else:
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            flat_types = [rtype for types in response_types for rtype in types]
+        if allowed_answers is None:
+            flat_answers = [()] * len(flat_prompts)
+        else:
+            flat_answers = [answers for per_image in allowed_answers for answers in per_image]
+        groups: Dict[Tuple[Optional[str], bool], List[int]] = {}
+        for row, (rtype, answers) in enumerate(zip(flat_types, flat_answers)):
+            groups.setdefault((rtype, bool(answers)), []).append(row)
+        
+        responses = [None] * len(flat_prompts)
+        with torch.inference_mode():
+            # Vision encoder + Q-Former once per image, not once per prompt
+            image_queries = self._encode_images(pixel_values)
+            for (rtype, constrained), rows in groups.items():
+                decoded = self._generate_group(
+                    image_queries.index_select(
+                        0, torch.tensor([owners[row] for row in rows], device=image_queries.device)
+                    ),
+                    [flat_prompts[row] for row in rows],
+                    rtype,
+                    [flat_answers[row] for row in rows] if constrained else None,
+                    max_new_tokens
+                )
+                for row, text in zip(rows, decoded):
+                    responses[row] = text
         
-        # Generate with settings optimized for BLIP-2 Flan-T5 (encoder-decoder, no echo issue)
-        with torch.no_grad():
+        # Split the flat responses back into one list per image
+        grouped = []
+        start = 0
+        for count in counts:
+            grouped.append(responses[start:start + count])
+            start += count
+        return grouped
+    
+    def _generate_group(
+        self,
+        image_queries: torch.Tensor,
+        prompts: List[str],
+        response_type: Optional[str],
+        answer_sets: Optional[List[Tuple[str, ...]]],
+        max_new_tokens: int
+    ) -> List[str]:
+        """
+        Run one generate call for prompts sharing a response type (called under
+        generate_batch's torch.inference_mode()). Device tensors
+        are released when this returns, so the caching allocator reuses them for
+        the next group without emptying the cache.
+        """
+        # Prepare inputs (prompts padded to a common length), one query row per prompt
+        inputs = self._move_inputs(self._tokenize_prompts(prompts))
+        input_ids = inputs["input_ids"]
+        attention_mask = inputs["attention_mask"]
+        
+        generation_kwargs = {
+            **GENERATION_KWARGS,
+            "max_new_tokens": max_new_tokens,
+            **RESPONSE_TYPE_GENERATION.get(response_type, {})
+        }
+        if answer_sets:
+            tries = [self._answer_trie(answers) for answers in answer_sets]
+            eos = [self.processor.tokenizer.eos_token_id]
+            
+            def allowed_tokens(batch_id, input_ids):
+                # Flan-T5 decoder ids start with the decoder start token
+                return tries[batch_id].get(tuple(input_ids[1:].tolist()), eos)
+            
+            generation_kwargs["prefix_allowed_tokens_fn"] = allowed_tokens
+            # Leave room for the longest answer plus EOS
+            longest = max(len(prefix) for trie in tries for prefix in trie) + 1
+            generation_kwargs["max_new_tokens"] = max(generation_kwargs["max_new_tokens"], longest)
+        
+        inputs_embeds = self.model.get_input_embeddings()(input_ids)
+        image_queries = image_queries.to(inputs_embeds.device, dtype=inputs_embeds.dtype)
+        image_token_index = getattr(self.model.config, "image_token_index", None)
+        if image_token_index is not None:
+            # Newer processors reserve image token slots in the prompt
+            image_mask = (input_ids == image_token_index).unsqueeze(-1).expand_as(inputs_embeds)
+            inputs_embeds[image_mask] = image_queries.flatten()
+        else:
+            inputs_embeds = torch.cat([image_queries, inputs_embeds], dim=1)
+            attention_mask = torch.cat([
+                torch.ones(image_queries.shape[:-1], dtype=attention_mask.dtype, device=attention_mask.device),
+                attention_mask
+            ], dim=1)
+        outputs = self.model.language_model.generate(
+            inputs_embeds=inputs_embeds,
+            attention_mask=attention_mask,
+            **generation_kwargs
+        )
+        
+        # Flan-T5 is encoder-decoder, output is just the answer (no prompt echo)
+        return [
+            self._clean_response(text)
+            for text in self.processor.batch_decode(outputs, skip_special_tokens=True)
+        ]
+    
+    def _encode_images(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        """
+        Run the vision encoder, Q-Former and language projection (the image half of
+        Blip2ForConditionalGeneration.generate) and return the query embeddings the
+        language model is conditioned on, one row per image.
+        
+        This and _generate_group follow generate() of the transformers versions pinned
+        in Filter/requirements.txt; check_generate_equivalence compares them against it.
+        """
+        image_embeds = self.model.vision_model(pixel_values, return_dict=True).last_hidden_state
+        image_attention_mask = torch.ones(
+            image_embeds.shape[:-1], dtype=torch.long, device=image_embeds.device
+        )
+        query_tokens = self.model.query_tokens.expand(image_embeds.shape[0], -1, -1)
+        query_output = self.model.qformer(
+            query_embeds=query_tokens,
+            encoder_hidden_states=image_embeds,
+            encoder_attention_mask=image_attention_mask,
+            return_dict=True
+        ).last_hidden_state
+        return self.model.language_projection(query_output)
+    
+    def check_generate_equivalence(
+        self,
+        pixel_values: torch.Tensor,
+        prompts: List[str],
+        max_new_tokens: int = 50
+    ) -> List[Tuple[str, str, str]]:
+        """
+        Answer prompts about one preprocessed image with generate_batch and with the
+        public Blip2ForConditionalGeneration.generate (image re-encoded per prompt),
+        using the same tokenized prompts and generation settings.
+        
+        Returns:
+            (prompt, generate_batch response, model.generate response) for every prompt
+            where the two differ (empty when they match)
+        """
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+        
+        responses = self.generate_batch(None, [prompts], max_new_tokens, pixel_values=pixel_values)[0]
+        
+        inputs = self._move_inputs(self._tokenize_prompts(prompts))
+        pixel_values = self._move_inputs({"pixel_values": pixel_values})["pixel_values"]
+        with torch.inference_mode():
             outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                min_new_tokens=1,
-                do_sample=False,  # Greedy for more consistent answers
-                num_beams=3,  # Beam search for better quality
-                length_penalty=1.0,
-                repetition_penalty=2.0,  # Prevent repetition (1.0 = no penalty)
-                no_repeat_ngram_size=3,  # Never repeat 3-grams
-                early_stopping=True,  # Stop when all beams are done
+                pixel_values=pixel_values.expand(len(prompts), -1, -1, -1),
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                **{**GENERATION_KWARGS, "max_new_tokens": max_new_tokens}
             )
+        reference = [
+            self._clean_response(text)
+            for text in self.processor.batch_decode(outputs, skip_special_tokens=True)
+        ]
         
-        # Flan-T5 is encoder-decoder, output is just the answer (no prompt echo)
-        response = self.processor.decode(outputs[0], skip_special_tokens=True)
+        return [
+            (prompt, response, expected)
+            for prompt, response, expected in zip(prompts, responses, reference)
+            if response != expected
+        ]
+    
+    @property
+    def decodes_on_device(self) -> bool:
+        """True when encoded image files are decoded and preprocessed on the GPU."""
+        return self._device_transform is not None
+    
+    def preprocess_encoded(
+        self,
+        encoded: List[torch.Tensor]
+    ) -> Tuple[Optional[torch.Tensor], List[Optional[str]]]:
+        """
+        Decode encoded image files on the GPU (JPEG via nvjpeg, other formats on CPU)
+        and resize/normalize them there.
+        
+        Returns:
+            Tuple of (stacked pixel values of the decoded images, error message or None per input)
+        """
+        images = []
+        errors = []
+        for data in encoded:
+            try:
+                if data[:2].tolist() == [0xFF, 0xD8]:
+                    image = torchvision.io.decode_jpeg(
+                        data, mode=torchvision.io.ImageReadMode.RGB, device=self.device
+                    )
+                else:
+                    image = torchvision.io.decode_image(
+                        data, mode=torchvision.io.ImageReadMode.RGB
+                    ).to(self.device)
+                images.append(self._device_transform(image))
+                errors.append(None)
+            except Exception as e:
+                errors.append(f"Failed to load image: {e}")
+        return (torch.stack(images) if images else None), errors
+    
+    def _tokenize_prompts(self, prompts: List[str]) -> Dict[str, torch.Tensor]:
+        """Tokenize prompts padded to a common length, reusing cached token ids per prompt text."""
+        for text in prompts:
+            if text not in self._token_cache:
+                encoded = self.processor(text=[text])
+                self._token_cache[text] = {k: v[0] for k, v in encoded.items()}
+        return dict(self.processor.tokenizer.pad(
+            [self._token_cache[text] for text in prompts],
+            padding=True,
+            pad_to_multiple_of=self._pad_multiple,
+            return_tensors="pt"
+        ))
+    
+    def _move_inputs(self, inputs) -> Dict[str, torch.Tensor]:
+        """Move inputs to the device (non-blocking from pinned loader batches), casting float tensors."""
+        return {
+            k: v.to(self.device, dtype=self._input_dtype, non_blocking=True) if v.is_floating_point()
+            else v.to(self.device, non_blocking=True)
+            for k, v in inputs.items()
+        }
+    
+    def _attn_implementation(self, half_precision: bool) -> str:
+        """Fused attention backend: FlashAttention-2 on Ampere+ GPUs in fp16, otherwise PyTorch SDPA."""
+        if (FLASH_ATTN_AVAILABLE and half_precision and self.device == "cuda"
+                and torch.cuda.get_device_capability()[0] >= 8):
+            return "flash_attention_2"
+        return "sdpa"
+    
+    def _load_pretrained(self, model_path: str, label: str, half_precision: bool, **kwargs):
+        """
+        Load the BLIP-2 model from the local cache (downloading if needed) with a
+        fused attention backend, falling back to the default attention when the
+        installed transformers does not support it for this model.
+        """
+        attn_implementation = self._attn_implementation(half_precision)
+        
+        def attention_error(e):
+            message = str(e).lower()
+            return "attention" in message or "attn" in message
         
+        for attn_kwargs in ({"attn_implementation": attn_implementation}, {}):
+            try:
+                try:
+                    model = Blip2ForConditionalGeneration.from_pretrained(
+                        model_path, local_files_only=True, **attn_kwargs, **kwargs
+                    )
+                    print(f"[INFO] Using cached model{label}")
+                except Exception as e:
+                    if attn_kwargs and attention_error(e):
+                        raise
+                    print(f"[INFO] Downloading model{label}...")
+                    model = Blip2ForConditionalGeneration.from_pretrained(model_path, **attn_kwargs, **kwargs)
+                return model
+            except Exception as e:
+                if not attn_kwargs or not attention_error(e):
+                    raise
+                print(f"[WARNING] {attn_implementation} attention not supported ({e}), using default attention")
+    
+    def _answer_trie(self, answers: Tuple[str, ...]) -> Dict[Tuple[int, ...], List[int]]:
+        """
+        Map each generated token prefix of the given answers to the tokens allowed
+        next (EOS once an answer is complete). Cached per answer set.
+        """
+        trie = self._answer_tries.get(answers)
+        if trie is None:
+            tokenizer = self.processor.tokenizer
+            next_tokens: Dict[Tuple[int, ...], set] = {}
+            for answer in answers:
+                ids = tokenizer(answer, add_special_tokens=False)["input_ids"] + [tokenizer.eos_token_id]
+                for i, token_id in enumerate(ids):
+                    next_tokens.setdefault(tuple(ids[:i]), set()).add(token_id)
+            trie = {prefix: sorted(ids) for prefix, ids in next_tokens.items()}
+            self._answer_tries[answers] = trie
+        return trie
+    
+    @staticmethod
+    def _clean_response(response: str) -> str:
+        """Strip whitespace and any echoed answer prefix from a decoded response."""
         # Clean up common patterns
         response = response.strip()
         
@@ -370,11 +817,6 @@ class CrystallizationVerifier:
             if response.lower().startswith(prefix.lower()):
                 response = response[len(prefix):].strip()
         
-        # Clean up to free VRAM
-        del inputs, outputs
-        if self.device == "cuda":
-            torch.cuda.empty_cache()
-        
         return response if response else "no response"
     
     def _validate_response_format(
@@ -394,8 +836,6 @@ class CrystallizationVerifier:
         Returns:
             Tuple of (is_valid, validation_message)
         """
-        import re
-        
         if not response or response == "no response":
             return False, "Empty or no response"
         
@@ -567,22 +1007,93 @@ class CrystallizationVerifier:
         Returns:
             Dictionary with verification results
         """
-        # Load image
+        return self.verify_captions([(image_path, caption_data)], prompts_to_use)[0]
+    
+    def verify_captions(
+        self, 
+        items: List[Tuple[str, Dict]],
+        prompts_to_use: List[str] = None,
+        pixel_values: Optional[torch.Tensor] = None,
+        prompts: Optional[List[VerificationPrompt]] = None
+    ) -> List[Dict]:
+        """
+        Verify several captions against their images, running every prompt of
+        every image through the model in a single batch.
+        
+        Args:
+            items: List of (image_path, caption_data) pairs
+            prompts_to_use: List of prompt IDs to use (None = all prompts)
+            pixel_values: Preprocessed images for all items (skips loading from disk)
+            prompts: Prompt configs already selected with select_prompts (overrides prompts_to_use)
+            
+        Returns:
+            One verification result dictionary per item, in order
+        """
+        # Select prompts
+        if prompts is None:
+            prompts = select_prompts(prompts_to_use)
+        
+        results = [None] * len(items)
+        loaded = []  # indices of items whose image loaded
+        images = []
+        prompt_texts = []
+        
+        for i, (image_path, caption_data) in enumerate(items):
+            # Load image (unless a loader already preprocessed it)
+            try:
+                if pixel_values is None:
+                    images.append(Image.open(image_path).convert("RGB"))
+            except Exception as e:
+                results[i] = {
+                    "status": "error",
+                    "error": f"Failed to load image: {e}",
+                    "image_path": image_path
+                }
+                continue
+            
+            # Format prompts with caption data (including growth_percentage for cross-validation)
+            fields = {
+                "expected_phase": caption_data.get("phase", "unknown"),
+                "caption": caption_data.get("initial_caption", ""),
+                "growth_percentage": caption_data.get("growth_percentage", "unknown")
+            }
+            prompt_texts.append([prompt_config.render(fields) for prompt_config in prompts])
+            loaded.append(i)
+        
+        if not loaded:
+            return results
+        
+        # All prompts for all loaded images go through the model in one batch
         try:
-            image = Image.open(image_path).convert("RGB")
+            responses = self.generate_batch(
+                images, prompt_texts,
+                pixel_values=pixel_values,
+                response_types=[[p.expected_response_type for p in prompts]] * len(prompt_texts),
+                allowed_answers=[[p.allowed_answers for p in prompts]] * len(prompt_texts)
+            )
+            generation_error = None
         except Exception as e:
-            return {
-                "status": "error",
-                "error": f"Failed to load image: {e}",
-                "image_path": image_path
-            }
+            responses = [[None] * len(texts) for texts in prompt_texts]
+            generation_error = e
         
-        # Select prompts
-        prompts = VERIFICATION_PROMPTS
-        if prompts_to_use:
-            prompts = [p for p in VERIFICATION_PROMPTS if p.id in prompts_to_use]
+        for i, texts, image_responses in zip(loaded, prompt_texts, responses):
+            image_path, caption_data = items[i]
+            results[i] = self._build_result(
+                image_path, caption_data, prompts, texts, image_responses, generation_error
+            )
         
-        # Run verification
+        return results
+    
+    def _build_result(
+        self,
+        image_path: str,
+        caption_data: Dict,
+        prompts: List[VerificationPrompt],
+        prompt_texts: List[str],
+        responses: List[Optional[str]],
+        generation_error: Optional[Exception] = None
+    ) -> Dict:
+        """Validate the responses for one image and assemble its result entry."""
         results = {
             "image_path": image_path,
             "image_name": caption_data.get("image", ""),
@@ -592,16 +1103,10 @@ class CrystallizationVerifier:
             "timestamp": datetime.now().isoformat()
         }
         
-        for prompt_config in prompts:
-            # Format prompt with caption data (including growth_percentage for cross-validation)
-            prompt_text = prompt_config.prompt.format(
-                expected_phase=caption_data.get("phase", "unknown"),
-                caption=caption_data.get("initial_caption", ""),
-                growth_percentage=caption_data.get("growth_percentage", "unknown")
-            )
-            
+        for prompt_config, prompt_text, response in zip(prompts, prompt_texts, responses):
             try:
-                response = self.generate_response(image, prompt_text)
+                if generation_error is not None:
+                    raise generation_error
                 # Validate response format matches expected type
                 is_valid, validation_msg = self._validate_response_format(
                     response, 
@@ -630,6 +1135,23 @@ class CrystallizationVerifier:
         
         return results
     
+    @staticmethod
+    def _predict_phase(response: str) -> Optional[str]:
+        """Map a phase classification answer to a phase (direct phase names win)."""
+        for phase in _PHASE_NAMES:
+            if phase in response:
+                return phase
+        # Map visual descriptions to phases
+        if "clear" in response:
+            return "unsaturated"
+        if "cloudy" in response or "small particle" in response:
+            return "labile"
+        if "particle" in response or "forming" in response:
+            return "intermediate"
+        if "large" in response or "crystal" in response:
+            return "metastable"
+        return None
+    
     def _summarize_verification(self, verification_results: Dict) -> Dict:
         """Summarize verification results into overall metrics."""
         summary = {
@@ -665,26 +1187,12 @@ class CrystallizationVerifier:
                     
             elif prompt_id == "crystal_clarity":
                 # Try to extract score (1-5)
-                import re
-                numbers = re.findall(r'\b([1-5])\b', response)
-                if numbers:
-                    summary["crystal_clarity_score"] = int(numbers[0])
+                match = _SCORE_RE.search(response)
+                if match:
+                    summary["crystal_clarity_score"] = int(match.group(1))
                         
             elif prompt_id == "phase_classification":
-                # Map visual descriptions to phases
-                if "clear liquid" in response or "clear" in response:
-                    summary["predicted_phase"] = "unsaturated"
-                elif "cloudy" in response or "small particle" in response:
-                    summary["predicted_phase"] = "labile"
-                elif "particle" in response or "forming" in response:
-                    summary["predicted_phase"] = "intermediate"
-                elif "large" in response or "crystal" in response:
-                    summary["predicted_phase"] = "metastable"
-                # Also check for direct phase names
-                for phase in ["unsaturated", "labile", "intermediate", "metastable"]:
-                    if phase in response:
-                        summary["predicted_phase"] = phase
-                        break
+                summary["predicted_phase"] = self._predict_phase(response)
             
             elif prompt_id == "growth_to_next_stage":
                 # Now asking "Is the liquid clear or cloudy?"
@@ -692,10 +1200,9 @@ class CrystallizationVerifier:
             
             elif prompt_id == "overall_verification":
                 # Extract overall score (1-10)
-                import re
-                scores = re.findall(r'\b([1-9]|10)\b', response)
-                if scores:
-                    summary["overall_score"] = int(scores[0])
+                match = _RATING_RE.search(response)
+                if match:
+                    summary["overall_score"] = int(match.group(1))
             
             elif prompt_id == "info_correct":
                 # Particles visible?
@@ -756,24 +1263,248 @@ class CrystallizationVerifier:
 
 # BATCH VERIFICATION
 
+def _path_key(path) -> str:
+    """Normalized form of a path for lookups in the dataset file index."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _index_dataset_files(root: Path) -> set:
+    """Collect every file under the dataset root with one scandir walk (no per-image stat calls)."""
+    files = set()
+    pending = [str(root)]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    else:
+                        files.add(_path_key(entry.path))
+        except OSError:
+            continue
+    return files
+
+
+class VerificationImageDataset(Dataset):
+    """
+    Resolves, decodes and preprocesses caption images so a DataLoader can
+    prepare upcoming batches on CPU workers while the model runs. With
+    read_only=True the workers only read the encoded files, leaving decoding
+    to the GPU.
+    """
+    
+    def __init__(
+        self,
+        captions: List[Tuple[int, Dict]],
+        image_processor,
+        read_only: bool = False,
+        dataset_files: Optional[set] = None
+    ):
+        self.captions = captions
+        self.image_processor = image_processor
+        self.read_only = read_only
+        self.dataset_files = dataset_files
+        self._root_key = _path_key(DATASET_ROOT)
+    
+    def _exists(self, path) -> bool:
+        """Check a path against the dataset index, stat-ing only paths outside the dataset root."""
+        if self.dataset_files is None:
+            return Path(path).exists()
+        key = _path_key(path)
+        if key in self.dataset_files:
+            return True
+        if key.startswith(self._root_key + os.sep):
+            return False
+        return Path(path).exists()
+    
+    def __len__(self):
+        return len(self.captions)
+    
+    def __getitem__(self, idx: int) -> Dict:
+        original_idx, caption_data = self.captions[idx]
+        item = {
+            "index": idx,
+            "original_idx": original_idx,
+            "caption_data": caption_data,
+            "image_path": None,
+            "pixel_values": None,
+            "encoded": None,
+            "error": None
+        }
+        
+        image_path = caption_data.get("image_path")
+        if not image_path or not self._exists(image_path):
+            # Try to reconstruct path
+            material = caption_data.get("category_id", "")
+            phase = caption_data.get("phase", "")
+            image_path = DATASET_ROOT / material / phase / caption_data.get("image", "")
+            if not self._exists(image_path):
+                return item
+        item["image_path"] = str(image_path)
+        if self.image_processor is None and not self.read_only:
+            # Paths only (a verification server loads the images itself)
+            return item
+        
+        try:
+            if self.read_only:
+                item["encoded"] = torchvision.io.read_file(str(image_path))
+            else:
+                image = Image.open(image_path).convert("RGB")
+                item["pixel_values"] = self.image_processor(images=image, return_tensors="pt")["pixel_values"][0]
+        except Exception as e:
+            item["error"] = f"Failed to load image: {e}"
+        return item
+
+
+def _collate_verification_batch(items: List[Dict]) -> Dict:
+    """Stack the pixel values of the loaded images in a batch into one tensor (or list the encoded files)."""
+    loaded = [item["pixel_values"] for item in items if item["pixel_values"] is not None]
+    return {
+        "items": [{k: v for k, v in item.items() if k not in ("pixel_values", "encoded")} for item in items],
+        "pixel_values": torch.stack(loaded) if loaded else None,
+        "encoded": [item["encoded"] for item in items if item["encoded"] is not None]
+    }
+
+
+def _configure_cuda_allocator():
+    """Set PYTORCH_CUDA_ALLOC_CONF unless the user already did (call before the first CUDA use)."""
+    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", CUDA_ALLOC_CONF)
+
+
+def _serve_authkey_file(port: int) -> Path:
+    return SERVE_AUTHKEY_DIR / f"serve_{port}.key"
+
+
+def _new_serve_authkey(port: int) -> bytes:
+    """
+    Authkey for a server start: taken from CEIPP_SERVE_AUTHKEY, or generated
+    and written to a key file only the current user can read.
+    """
+    if os.environ.get(SERVE_AUTHKEY_ENV):
+        return bytes.fromhex(os.environ[SERVE_AUTHKEY_ENV])
+    authkey = os.urandom(32)
+    key_file = _serve_authkey_file(port)
+    key_file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(authkey.hex())
+    os.chmod(key_file, 0o600)  # in case the file already existed
+    return authkey
+
+
+def _load_serve_authkey(port: int) -> bytes:
+    """Authkey of the server on port (CEIPP_SERVE_AUTHKEY, else its key file)."""
+    if os.environ.get(SERVE_AUTHKEY_ENV):
+        return bytes.fromhex(os.environ[SERVE_AUTHKEY_ENV])
+    return bytes.fromhex(_serve_authkey_file(port).read_text().strip())
+
+
+class VerificationClient:
+    """
+    Thin client for a verifier started with --mode serve. Offers the same
+    verify_captions interface, while the server keeps the model loaded.
+    """
+    device = "remote"
+    decodes_on_device = False
+    
+    def __init__(self, port: int = SERVE_PORT):
+        self.conn = Client(("localhost", port), authkey=_load_serve_authkey(port))
+    
+    def verify_captions(
+        self,
+        items: List[Tuple[str, Dict]],
+        prompts_to_use: List[str] = None,
+        pixel_values: Optional[torch.Tensor] = None,
+        prompts: Optional[List[VerificationPrompt]] = None
+    ) -> List[Dict]:
+        """Send (image_path, caption_data) items to the server; images are loaded there."""
+        if prompts is not None:
+            prompts_to_use = [p.id for p in prompts]
+        self.conn.send({"items": items, "prompts_to_use": prompts_to_use})
+        reply = self.conn.recv()
+        if "error" in reply:
+            raise RuntimeError(f"Verification server error: {reply['error']}")
+        return reply["results"]
+    
+    def close(self):
+        self.conn.close()
+
+
+def serve(model_name: str = "blip2_small", port: int = SERVE_PORT, compile_decoder: bool = False):
+    """
+    Load the model once and answer verify_captions requests from
+    VerificationClient connections until interrupted.
+    
+    Connections carry pickles, so clients must present a per-start authkey
+    (CEIPP_SERVE_AUTHKEY, or the key file under ~/.ceipp).
+    """
+    _configure_cuda_allocator()
+    
+    try:
+        authkey = _new_serve_authkey(port)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] No authkey for the verification server: {e}")
+        return
+    
+    verifier = CrystallizationVerifier(model_name=model_name, compile_decoder=compile_decoder)
+    if not verifier.load_model():
+        print("[ERROR] Failed to load model. Exiting.")
+        return
+    
+    with Listener(("localhost", port), authkey=authkey) as listener:
+        print(f"[OK] Verification server listening on localhost:{port} (Ctrl+C to stop)")
+        if not os.environ.get(SERVE_AUTHKEY_ENV):
+            print(f"[INFO] Authkey written to: {_serve_authkey_file(port)}")
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    print(f"[WARNING] Rejected connection: {e}")
+                    continue
+                with conn:
+                    print(f"[INFO] Client connected: {listener.last_accepted}")
+                    while True:
+                        try:
+                            request = conn.recv()
+                        except EOFError:
+                            break
+                        try:
+                            results = verifier.verify_captions(request["items"], request.get("prompts_to_use"))
+                            conn.send({"results": results})
+                        except Exception as e:
+                            conn.send({"error": str(e)})
+                    print("[INFO] Client disconnected")
+        except KeyboardInterrupt:
+            print("\n[INFO] Verification server stopped")
+
+
 def run_batch_verification(
     captions_file: str = None,
     output_dir: str = None,
     model_name: str = "blip2_small",
     sample_size: int = None,
     prompts_to_use: List[str] = None,
-    resume: bool = True
+    resume: bool = True,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    num_workers: int = LOADER_WORKERS,
+    compile_decoder: bool = False,
+    server_port: Optional[int] = None
 ) -> Tuple[List[Dict], Dict]:
     """
     Run verification on a batch of captions with checkpoint/resume support.
     
     Args:
-        captions_file: Path to JSON file with captions
+        captions_file: Path to the captions file (.jsonl or legacy .json)
         output_dir: Directory for output files
         model_name: Model to use for verification
         sample_size: Number of samples to process (None = all)
         prompts_to_use: List of prompt IDs (None = all prompts)
         resume: If True, resume from last checkpoint (default: True)
+        batch_size: Images verified per generate call (lower it if VRAM runs out)
+        num_workers: DataLoader workers preparing images ahead of the GPU (0 = main thread)
+        compile_decoder: Compile the language model with torch.compile (needs Triton)
+        server_port: Send work to a running --mode serve process instead of loading the model
         
     Returns:
         Tuple of (verification results list, statistics dict)
@@ -785,6 +1516,8 @@ def run_batch_verification(
     # Checkpoint file for resuming
     checkpoint_file = output_dir / "verification_checkpoint.json"
     results_file = output_dir / "verification_results.json"
+    # Results are appended here as they complete; the full JSON is written once at the end
+    results_log_file = output_dir / "verification_results_partial.jsonl"
     
     print("=" * 80)
     print("LLM Verification Pipeline - Crystallization Caption Cross-Validation")
@@ -796,8 +1529,7 @@ def run_batch_verification(
         print("[INFO] Please run generate_captions_enhanced.py first.")
         return [], {}
     
-    with open(captions_file, 'r', encoding='utf-8') as f:
-        captions = json.load(f)
+    captions = load_captions(captions_file)
     
     print(f"[INFO] Loaded {len(captions)} captions")
     
@@ -805,18 +1537,22 @@ def run_batch_verification(
     results = []
     processed_images = set()
     start_index = 0
+    log_offset = 0  # bytes of the results log covered by the checkpoint
     
     if resume and checkpoint_file.exists():
         try:
-            with open(checkpoint_file, 'r', encoding='utf-8') as f:
-                checkpoint = json.load(f)
-            
-            # Load existing results
-            if results_file.exists():
-                with open(results_file, 'r', encoding='utf-8') as f:
-                    results = json.load(f)
+            checkpoint = load_json(checkpoint_file)
             
-            processed_images = set(checkpoint.get("processed_images", []))
+            # Load existing results (only the lines covered by the checkpoint)
+            if "results_count" in checkpoint:
+                results, processed_images, log_offset = _load_results_log(
+                    results_log_file, checkpoint["results_count"]
+                )
+            else:
+                # Checkpoint written before the JSONL log existed
+                if results_file.exists():
+                    results = load_json(results_file)
+                processed_images = set(checkpoint.get("processed_images", []))
             start_index = checkpoint.get("last_index", 0)
             
             print(f"[INFO] Resuming from checkpoint: {len(processed_images)} images already processed")
@@ -827,6 +1563,7 @@ def run_batch_verification(
             results = []
             processed_images = set()
             start_index = 0
+            log_offset = 0
     
     # Sample if needed (only for fresh starts)
     if sample_size and sample_size < len(captions) and not processed_images:
@@ -847,12 +1584,23 @@ def run_batch_verification(
     
     print(f"[INFO] {len(remaining_captions)} images remaining to verify")
     
-    # Initialize verifier
-    verifier = CrystallizationVerifier(model_name=model_name)
-    
-    if not verifier.load_model():
-        print("[ERROR] Failed to load model. Exiting.")
-        return [], {}
+    # Initialize verifier (or connect to a server that already has the model loaded)
+    if server_port is not None:
+        try:
+            verifier = VerificationClient(server_port)
+        except (OSError, ValueError, AuthenticationError) as e:
+            print(f"[ERROR] Could not connect to verification server on port {server_port}: {e}")
+            print("[INFO] Start one with: python llm_verification.py --mode serve")
+            return [], {}
+        print(f"[OK] Connected to verification server on port {server_port}")
+        image_processor = None  # the server loads the images itself
+    else:
+        verifier = CrystallizationVerifier(model_name=model_name, compile_decoder=compile_decoder)
+        
+        if not verifier.load_model():
+            print("[ERROR] Failed to load model. Exiting.")
+            return [], {}
+        image_processor = verifier.processor.image_processor
     
     # Run verification
     statistics = {
@@ -869,59 +1617,130 @@ def run_batch_verification(
     print("[INFO] Press Ctrl+C to pause (progress will be saved)")
     print("-" * 80)
     
+    # Index the dataset once so image paths resolve without a stat call per image
+    dataset_files = _index_dataset_files(DATASET_ROOT)
+    print(f"[INFO] Indexed {len(dataset_files)} files under {DATASET_ROOT}")
+    
+    # Decode and preprocess upcoming batches on CPU workers while the GPU runs
+    # (workers only read the files when the GPU does the decoding)
+    loader = DataLoader(
+        VerificationImageDataset(
+            remaining_captions,
+            image_processor,
+            read_only=verifier.decodes_on_device,
+            dataset_files=dataset_files
+        ),
+        batch_size=batch_size,
+        num_workers=num_workers,
+        collate_fn=_collate_verification_batch,
+        pin_memory=verifier.device == "cuda",
+        prefetch_factor=LOADER_PREFETCH if num_workers > 0 else None,
+        persistent_workers=False
+    )
+    
+    # Log appends and checkpoints are written by a background thread, in order
+    if log_offset:
+        # Drop log lines written after the last checkpoint, then keep appending
+        with open(results_log_file, 'r+b') as f:
+            f.truncate(log_offset)
+        results_log = ResultsLogWriter(results_log_file, checkpoint_file, append=True)
+    else:
+        # Fresh start, or a checkpoint from before the log: seed it with the loaded results
+        results_log = ResultsLogWriter(results_log_file, checkpoint_file, append=False)
+        for result in results:
+            image_name = result.get("image_name") or Path(result.get("image_path", "")).name
+            results_log.append(image_name, result)
+    
+    prompts = select_prompts(prompts_to_use)
+    
+    original_idx = start_index
+    # Redraw the bar at most once a second (and every ~0.2% of images)
+    progress = tqdm(
+        total=len(remaining_captions),
+        desc="Verifying",
+        mininterval=1.0,
+        miniters=max(1, len(remaining_captions) // 500)
+    )
     try:
-        for idx, (original_idx, caption_data) in enumerate(tqdm(remaining_captions, desc="Verifying")):
-            image_path = caption_data.get("image_path")
-            image_name = caption_data.get("image", "")
+        for batch in loader:
+            items = batch["items"]
+            pixel_values = batch["pixel_values"]
             
-            if not image_path or not Path(image_path).exists():
-                # Try to reconstruct path
-                material = caption_data.get("category_id", "")
-                phase = caption_data.get("phase", "")
-                image_path = DATASET_ROOT / material / phase / image_name
+            if verifier.decodes_on_device:
+                pixel_values, decode_errors = verifier.preprocess_encoded(batch["encoded"])
+                read = [item for item in items if item["image_path"] and item["error"] is None]
+                for item, error in zip(read, decode_errors):
+                    item["error"] = error
             
-            if not Path(image_path).exists():
-                statistics["errors"] += 1
-                continue
-            
-            result = verifier.verify_caption(
-                str(image_path),
-                caption_data,
-                prompts_to_use
-            )
+            # Images that decoded fine go through the model together
+            loaded = [item for item in items if item["image_path"] and item["error"] is None]
+            verified = iter(verifier.verify_captions(
+                [(item["image_path"], item["caption_data"]) for item in loaded],
+                pixel_values=pixel_values,
+                prompts=prompts
+            ) if loaded else [])
             
-            results.append(result)
-            processed_images.add(image_name)
-            statistics["total_processed"] += 1
-            
-            if result.get("verification_summary", {}).get("phase_match"):
-                statistics["successful"] += 1
+            for item in items:
+                idx = item["index"]
+                original_idx = item["original_idx"]
+                caption_data = item["caption_data"]
                 
-            if result.get("verification_summary", {}).get("needs_review"):
-                statistics["needs_review_count"] += 1
-            
-            # Track by phase
-            phase = caption_data.get("phase", "unknown")
-            if phase not in statistics["by_phase"]:
-                statistics["by_phase"][phase] = {"total": 0, "phase_match": 0, "caption_accurate": 0}
-            statistics["by_phase"][phase]["total"] += 1
-            
-            if result.get("verification_summary", {}).get("phase_match"):
-                statistics["by_phase"][phase]["phase_match"] += 1
-            if result.get("verification_summary", {}).get("caption_accurate"):
-                statistics["by_phase"][phase]["caption_accurate"] += 1
+                if item["image_path"] is None:
+                    statistics["errors"] += 1
+                    continue
+                
+                if item["error"] is not None:
+                    result = {
+                        "status": "error",
+                        "error": item["error"],
+                        "image_path": item["image_path"]
+                    }
+                else:
+                    result = next(verified)
+                
+                image_name = caption_data.get("image", "")
+                
+                results.append(result)
+                results_log.append(image_name, result)
+                processed_images.add(image_name)
+                statistics["total_processed"] += 1
+                
+                if result.get("verification_summary", {}).get("phase_match"):
+                    statistics["successful"] += 1
+                    
+                if result.get("verification_summary", {}).get("needs_review"):
+                    statistics["needs_review_count"] += 1
+                
+                # Track by phase
+                phase = caption_data.get("phase", "unknown")
+                if phase not in statistics["by_phase"]:
+                    statistics["by_phase"][phase] = {"total": 0, "phase_match": 0, "caption_accurate": 0}
+                statistics["by_phase"][phase]["total"] += 1
+                
+                if result.get("verification_summary", {}).get("phase_match"):
+                    statistics["by_phase"][phase]["phase_match"] += 1
+                if result.get("verification_summary", {}).get("caption_accurate"):
+                    statistics["by_phase"][phase]["caption_accurate"] += 1
+                
+                # Save checkpoint every 10 images
+                if (idx + 1) % 10 == 0:
+                    results_log.checkpoint(original_idx, len(results))
             
-            # Save checkpoint every 10 images
-            if (idx + 1) % 10 == 0:
-                _save_checkpoint(checkpoint_file, results_file, results, processed_images, original_idx)
+            progress.update(len(items))
     
     except KeyboardInterrupt:
         print("\n\n[PAUSED] Verification paused by user.")
         print("[INFO] Saving checkpoint...")
-        _save_checkpoint(checkpoint_file, results_file, results, processed_images, original_idx)
+        results_log.checkpoint(original_idx, len(results))
+        results_log.close()
         print(f"[INFO] Progress saved: {len(processed_images)}/{len(captions)} images")
         print("[INFO] Run the same command again to resume.")
         return results, statistics
+    finally:
+        progress.close()
+        results_log.close()
+        if server_port is not None:
+            verifier.close()
     
     # Calculate rates
     if statistics["total_processed"] > 0:
@@ -934,24 +1753,23 @@ def run_batch_verification(
         statistics["caption_accuracy_rate"] = caption_matches / statistics["total_processed"]
     
     # Save final results
-    with open(results_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    dump_json(results, results_file)
     print(f"\n[OK] Results saved to: {results_file}")
     
     stats_file = output_dir / "verification_statistics.json"
-    with open(stats_file, 'w', encoding='utf-8') as f:
-        json.dump(statistics, f, indent=2, ensure_ascii=False)
+    dump_json(statistics, stats_file)
     print(f"[OK] Statistics saved to: {stats_file}")
     
     # Save items needing review
     review_items = [r for r in results if r.get("verification_summary", {}).get("needs_review")]
     if review_items:
         review_file = output_dir / "needs_review.json"
-        with open(review_file, 'w', encoding='utf-8') as f:
-            json.dump(review_items, f, indent=2, ensure_ascii=False)
+        dump_json(review_items, review_file)
         print(f"[OK] Items needing review saved to: {review_file}")
     
-    # Remove checkpoint file when complete
+    # Remove checkpoint files when complete
+    if results_log_file.exists():
+        results_log_file.unlink()
     if checkpoint_file.exists():
         checkpoint_file.unlink()
         print("[OK] Checkpoint cleared (verification complete)")
@@ -968,24 +1786,144 @@ def run_batch_verification(
     return results, statistics
 
 
-def _save_checkpoint(checkpoint_file, results_file, results, processed_images, last_index):
-    """Save checkpoint for resume functionality."""
-    # Save results so far
-    with open(results_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
-    
-    # Save checkpoint info
+def _load_results_log(results_log_file: Path, count: int) -> Tuple[List[Dict], set, int]:
+    """
+    Load the first `count` results and their image names from the append-only
+    results log, along with the byte offset just past them.
+    """
+    results = []
+    processed_images = set()
+    if not results_log_file.exists():
+        return results, processed_images, 0
+    with open(results_log_file, 'rb') as f:
+        while len(results) < count:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                entry = loads(line)
+                results.append(entry["result"])
+                processed_images.add(entry["image"])
+        return results, processed_images, f.tell()
+
+def _save_checkpoint(checkpoint_file, last_index, results_count):
+    """Save checkpoint for resume functionality (results and image names are in the JSONL log)."""
     checkpoint = {
-        "processed_images": list(processed_images),
         "last_index": last_index,
+        "results_count": results_count,
         "timestamp": datetime.now().isoformat(),
-        "total_processed": len(processed_images)
+        "total_processed": results_count
     }
-    with open(checkpoint_file, 'w', encoding='utf-8') as f:
-        json.dump(checkpoint, f, indent=2)
+    dump_json(checkpoint, checkpoint_file)
+
+class ResultsLogWriter:
+    """
+    Appends results to the JSONL log and saves checkpoints on a background thread,
+    so the verification loop does not wait on serialization or disk. Tasks run in
+    submission order and the log is flushed before each checkpoint, so every line
+    a checkpoint counts is on disk (lines after it are dropped on resume).
+    """
+    
+    def __init__(self, results_log_file: Path, checkpoint_file: Path, append: bool):
+        self._log = open(results_log_file, 'ab' if append else 'wb', buffering=LOG_BUFFER_SIZE)
+        self._checkpoint_file = checkpoint_file
+        self._queue = queue.Queue()
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="results-log", daemon=True)
+        self._thread.start()
+    
+    def append(self, image_name: str, result: Dict):
+        """Queue one result for the log."""
+        self._put(("result", image_name, result))
+    
+    def checkpoint(self, last_index: int, results_count: int):
+        """Queue a checkpoint covering the first results_count logged results."""
+        self._put(("checkpoint", last_index, results_count))
+    
+    def close(self):
+        """Wait for queued writes, then close the log (safe to call twice)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._log.close()
+        if self._error is not None:
+            raise self._error
+    
+    def _put(self, task):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(task)
+    
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            if self._error is not None:
+                continue  # Stop writing after a failure, close() reports it
+            try:
+                if task[0] == "result":
+                    self._log.write(json_line({"image": task[1], "result": task[2]}))
+                else:
+                    self._log.flush()
+                    _save_checkpoint(self._checkpoint_file, task[1], task[2])
+            except Exception as e:
+                self._error = e
 
 # QUICK VERIFICATION (Without full model loading)
 
+def check_generate(captions_file: str = None, model_name: str = "blip2_small") -> bool:
+    """
+    Compare generate_batch against the public model.generate() on every prompt for
+    the first caption whose image can be found. Run after changing the transformers version.
+    """
+    captions_file = Path(captions_file or CAPTIONS_FILE)
+    if not captions_file.exists():
+        print(f"[ERROR] Captions file not found: {captions_file}")
+        return False
+    
+    verifier = CrystallizationVerifier(model_name=model_name)
+    if not verifier.load_model():
+        print("[ERROR] Failed to load model. Exiting.")
+        return False
+    
+    dataset = VerificationImageDataset(
+        list(enumerate(load_captions(captions_file))),
+        verifier.processor.image_processor
+    )
+    item = next(
+        (item for item in map(dataset.__getitem__, range(len(dataset))) if item["pixel_values"] is not None),
+        None
+    )
+    if item is None:
+        print("[ERROR] No caption image could be loaded")
+        return False
+    
+    caption_data = item["caption_data"]
+    fields = {
+        "expected_phase": caption_data.get("phase", "unknown"),
+        "caption": caption_data.get("initial_caption", ""),
+        "growth_percentage": caption_data.get("growth_percentage", "unknown")
+    }
+    prompts = [prompt_config.render(fields) for prompt_config in VERIFICATION_PROMPTS]
+    print(f"[INFO] Comparing generate paths on {item['image_path']} ({len(prompts)} prompts)")
+    
+    mismatches = verifier.check_generate_equivalence(_collate_verification_batch([item])["pixel_values"], prompts)
+    if not mismatches:
+        print(f"[OK] generate_batch matches model.generate() on all {len(prompts)} prompts")
+        return True
+    
+    print(f"[ERROR] generate_batch differs from model.generate() on {len(mismatches)} of {len(prompts)} prompts:")
+    for prompt, response, expected in mismatches:
+        print(f"  - {prompt}")
+        print(f"    generate_batch: {response!r}")
+        print(f"    model.generate: {expected!r}")
+    return False
+
+
 def generate_verification_prompts_only(
     captions_file: str = None,
     output_dir: str = None
@@ -1001,40 +1939,39 @@ def generate_verification_prompts_only(
         print(f"[ERROR] Captions file not found: {captions_file}")
         return {}
     
-    with open(captions_file, 'r', encoding='utf-8') as f:
-        captions = json.load(f)
+    captions = load_captions(captions_file)
     
     os.makedirs(output_dir, exist_ok=True)
     
-    # Generate prompts for each caption
-    all_prompts = []
+    # Generate prompts for each caption (per-prompt constants looked up once)
+    templates = [
+        (prompt_config.id, prompt_config, prompt_config.expected_response_type)
+        for prompt_config in VERIFICATION_PROMPTS
+    ]
+    all_prompts = [None] * len(captions)
     
-    for caption_data in captions:
-        image_prompts = {
+    for i, caption_data in enumerate(captions):
+        fields = {
+            "expected_phase": caption_data.get("phase", "unknown"),
+            "caption": caption_data.get("initial_caption", "")
+        }
+        all_prompts[i] = {
             "image": caption_data.get("image", ""),
             "image_path": caption_data.get("image_path", ""),
             "phase": caption_data.get("phase", ""),
-            "prompts": []
+            "prompts": [
+                {
+                    "id": prompt_id,
+                    "prompt": prompt_config.render(fields),
+                    "response_type": response_type
+                }
+                for prompt_id, prompt_config, response_type in templates
+            ]
         }
-        
-        for prompt_config in VERIFICATION_PROMPTS:
-            formatted_prompt = prompt_config.prompt.format(
-                expected_phase=caption_data.get("phase", "unknown"),
-                caption=caption_data.get("initial_caption", "")
-            )
-            
-            image_prompts["prompts"].append({
-                "id": prompt_config.id,
-                "prompt": formatted_prompt,
-                "response_type": prompt_config.expected_response_type
-            })
-        
-        all_prompts.append(image_prompts)
     
     # Save prompts
     prompts_file = output_dir / "verification_prompts_prepared.json"
-    with open(prompts_file, 'w', encoding='utf-8') as f:
-        json.dump(all_prompts, f, indent=2, ensure_ascii=False)
+    dump_json(all_prompts, prompts_file)
     
     print(f"[OK] Verification prompts saved to: {prompts_file}")
     print(f"[INFO] Total images: {len(all_prompts)}")
@@ -1047,19 +1984,23 @@ def generate_verification_prompts_only(
 def main():
     import argparse
     
+    _configure_cuda_allocator()
+    
     parser = argparse.ArgumentParser(
         description="LLM Verification for Crystallization Captions"
     )
     parser.add_argument(
         "--mode", 
-        choices=["verify", "prompts_only"],
+        choices=["verify", "prompts_only", "serve", "check_generate"],
         default="prompts_only",
-        help="Mode: 'verify' runs full verification, 'prompts_only' generates prompts without model"
+        help="Mode: 'verify' runs full verification, 'prompts_only' generates prompts without model, "
+             "'serve' keeps the model loaded for --remote verify runs, "
+             "'check_generate' compares the batched generate path with model.generate() on one image"
     )
     parser.add_argument(
         "--model",
         default="blip2_small",
-        help="Model to use (blip2_small, blip2_flan, blip2_flan_8bit, blip2_flan_xxl)"
+        help="Model to use (blip2_small, blip2_flan, blip2_flan_8bit, blip2_flan_nf4, blip2_flan_xxl)"
     )
     parser.add_argument(
         "--sample",
@@ -1070,7 +2011,35 @@ def main():
     parser.add_argument(
         "--captions",
         default=None,
-        help="Path to captions JSON file"
+        help="Path to captions file (.jsonl or legacy .json)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Images verified per generate call (default: {DEFAULT_BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=LOADER_WORKERS,
+        help=f"DataLoader workers preparing images (default: {LOADER_WORKERS}, 0 = main thread)"
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="Compile the language model with torch.compile (CUDA + Triton only)"
+    )
+    parser.add_argument(
+        "--remote",
+        action="store_true",
+        help="Verify using a running '--mode serve' process instead of loading the model"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=SERVE_PORT,
+        help=f"Verification server port (default: {SERVE_PORT})"
     )
     
     args = parser.parse_args()
@@ -1079,8 +2048,17 @@ def main():
         run_batch_verification(
             captions_file=args.captions,
             model_name=args.model,
-            sample_size=args.sample
+            sample_size=args.sample,
+            batch_size=args.batch_size,
+            num_workers=args.workers,
+            compile_decoder=args.compile,
+            server_port=args.port if args.remote else None
         )
+    elif args.mode == "serve":
+        serve(model_name=args.model, port=args.port, compile_decoder=args.compile)
+    elif args.mode == "check_generate":
+        if not check_generate(captions_file=args.captions, model_name=args.model):
+            sys.exit(1)
     else:
         generate_verification_prompts_only(captions_file=args.captions)
 
@@ -2,15 +2,114 @@
 Re-process verification results with improved confidence logic.
 Uses existing responses but recalculates confidence and needs_review.
 """
-import json
+import os
 import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from itertools import chain, islice
+from pathlib import Path
+
+from json_io import array_item_json, dump_json, iter_json_array
+
+# Score extraction (first 1-5 clarity score, first 1-10 rating, first integer)
+_SCORE_RE = re.compile(r'\b([1-5])\b')
+_RATING_RE = re.compile(r'\b([1-9]|10)\b')
+_INT_RE = re.compile(r'\b(\d+)\b')
+
+# Phase names in a response override the visual description
+_PHASE_NAMES = ("unsaturated", "labile", "intermediate", "metastable")
+
+# Visual description -> phase, checked in order after the clear-liquid rule
+_PHASE_KEYWORDS = (
+    ("cloudy", "labile"),
+    ("particle", "intermediate"),  # also covers "small particle"
+    ("crystal", "metastable"),  # also covers "large crystal"
+)
+
+# Particle count wording -> normalized count, first match wins
+_PARTICLE_COUNT_KEYWORDS = (
+    ("none", "none"),
+    ("no particle", "none"),
+    ("not visible", "none"),
+    ("few", "few"),  # also covers "a few"
+    ("some", "some"),
+    ("several", "some"),
+    ("many", "many"),
+    ("lot", "many"),
+    ("multiple", "many"),
+)
+
+# Summaries are recalculated in worker processes for runs with more results than
+# this, in chunks of RECALC_CHUNKSIZE, with at most RECALC_WINDOW results in flight
+PARALLEL_RECALC_THRESHOLD = 5_000
+RECALC_CHUNKSIZE = 256
+RECALC_WINDOW = 16_384
+
+
+def _classify_phase(response):
+    """Map a phase_classification response to a phase (None when nothing matches)."""
+    # Direct phase names override
+    for phase in _PHASE_NAMES:
+        if phase in response:
+            return phase
+    # Map visual descriptions to phases
+    if "clear liquid" in response or ("clear" in response and "liquid" not in response):
+        return "unsaturated"
+    for keyword, phase in _PHASE_KEYWORDS:
+        if keyword in response:
+            return phase
+    return None
+
 
 def recalculate_summary(verification_results, expected_phase):
     """Recalculate summary with improved logic"""
+    return dict(_recalculate_summary_cached(_summary_inputs(verification_results), expected_phase))
+
+
+def _summary_inputs(verification_results):
+    """(prompt_id, response or None if unsuccessful) pairs, all the summary reads from the results."""
+    # Results with the same pairs (very common: the model answers "none"/"no" a lot)
+    # share one cached computation
+    return tuple(
+        (prompt_id, result.get("response", "") if result.get("status") == "success" else None)
+        for prompt_id, result in verification_results.items()
+    )
+
+
+def _recalculate_chunk(inputs):
+    """Pool worker: summaries for a chunk of (responses, expected_phase) inputs."""
+    return [dict(_recalculate_summary_cached(responses, expected_phase)) for responses, expected_phase in inputs]
+
+
+def _with_summary(r):
+    """Recalculate one result's summary in this process."""
+    r['verification_summary'] = recalculate_summary(r['verification_results'], r['expected_phase'])
+    return r
+
+
+def _recalculate_in_workers(executor, records):
+    """Yield records with summaries computed in worker processes (only the inputs are sent)."""
+    while True:
+        window = list(islice(records, RECALC_WINDOW))
+        if not window:
+            return
+        inputs = [(_summary_inputs(r['verification_results']), r['expected_phase']) for r in window]
+        chunks = [inputs[i:i + RECALC_CHUNKSIZE] for i in range(0, len(inputs), RECALC_CHUNKSIZE)]
+        summaries = chain.from_iterable(executor.map(_recalculate_chunk, chunks))
+        for r, summary in zip(window, summaries):
+            r['verification_summary'] = summary
+            yield r
+
+
+@lru_cache(maxsize=65536)
+def _recalculate_summary_cached(responses, expected_phase):
+    """Summary for (prompt_id, response or None if unsuccessful) pairs; callers copy the result."""
     
     summary = {
-        "total_prompts": len(verification_results),
-        "successful_prompts": sum(1 for v in verification_results.values() if v.get("status") == "success"),
+        "total_prompts": len(responses),
+        "successful_prompts": sum(1 for _, response in responses if response is not None),
         "phase_match": None,
         "caption_accurate": None,
         "crystal_clarity_score": None,
@@ -24,11 +123,11 @@ def recalculate_summary(verification_results, expected_phase):
         "liquid_clarity": None
     }
     
-    for prompt_id, result in verification_results.items():
-        if result.get("status") != "success":
+    for prompt_id, response in responses:
+        if response is None:
             continue
             
-        response = result.get("response", "").lower().strip()
+        response = response.lower().strip()
         
         if prompt_id == "phase_correct":
             summary["phase_match"] = "yes" in response
@@ -37,33 +136,22 @@ def recalculate_summary(verification_results, expected_phase):
             summary["caption_accurate"] = "yes" in response
                 
         elif prompt_id == "crystal_clarity":
-            numbers = re.findall(r'\b([1-5])\b', response)
-            if numbers:
-                summary["crystal_clarity_score"] = int(numbers[0])
+            match = _SCORE_RE.search(response)
+            if match:
+                summary["crystal_clarity_score"] = int(match.group(1))
                     
         elif prompt_id == "phase_classification":
-            # Map visual descriptions to phases
-            if "clear liquid" in response or ("clear" in response and "liquid" not in response):
-                summary["predicted_phase"] = "unsaturated"
-            elif "cloudy" in response:
-                summary["predicted_phase"] = "labile"
-            elif "small particle" in response or "particle" in response:
-                summary["predicted_phase"] = "intermediate"
-            elif "large crystal" in response or "crystal" in response:
-                summary["predicted_phase"] = "metastable"
-            # Direct phase names override
-            for phase in ["unsaturated", "labile", "intermediate", "metastable"]:
-                if phase in response:
-                    summary["predicted_phase"] = phase
-                    break
+            predicted = _classify_phase(response)
+            if predicted:
+                summary["predicted_phase"] = predicted
         
         elif prompt_id == "growth_to_next_stage":
             summary["liquid_clarity"] = response
         
         elif prompt_id == "overall_verification":
-            scores = re.findall(r'\b([1-9]|10)\b', response)
-            if scores:
-                summary["overall_score"] = int(scores[0])
+            match = _RATING_RE.search(response)
+            if match:
+                summary["overall_score"] = int(match.group(1))
         
         elif prompt_id == "info_correct":
             summary["particles_visible"] = "yes" in response
@@ -71,22 +159,16 @@ def recalculate_summary(verification_results, expected_phase):
         elif prompt_id == "crystal_count":
             summary["particle_count"] = response
             # Normalize particle count response
-            if "none" in response or "no particle" in response or "not visible" in response:
-                summary["particle_count_normalized"] = "none"
-            elif "few" in response or "a few" in response:
-                summary["particle_count_normalized"] = "few"
-            elif "some" in response or "several" in response:
-                summary["particle_count_normalized"] = "some"
-            elif "many" in response or "lot" in response or "multiple" in response:
-                summary["particle_count_normalized"] = "many"
-            else:
-                summary["particle_count_normalized"] = "unknown"
+            summary["particle_count_normalized"] = next(
+                (count for keyword, count in _PARTICLE_COUNT_KEYWORDS if keyword in response),
+                "unknown"
+            )
         
         elif prompt_id == "growth_estimation":
             # Extract percentage
-            numbers = re.findall(r'\b(\d+)\b', response)
-            if numbers:
-                summary["growth_percentage"] = int(numbers[0])
+            match = _INT_RE.search(response)
+            if match:
+                summary["growth_percentage"] = int(match.group(1))
     
     # IMPROVED confidence calculation v3
     # Focus on consistency and available data
@@ -141,54 +223,55 @@ def recalculate_summary(verification_results, expected_phase):
 
 
 def main():
-    # Load existing results
-    results_file = r'D:\user\CEIPP\LLM\llm_verification_results\verification_results.json'
-    
-    print("Loading existing verification results...")
-    with open(results_file, 'r', encoding='utf-8') as f:
-        results = json.load(f)
-    
-    print(f"Processing {len(results)} results with improved logic...")
-    
-    # Recalculate summaries
-    for r in results:
-        r['verification_summary'] = recalculate_summary(
-            r['verification_results'],
-            r['expected_phase']
-        )
-    
-    # Save updated results
-    print("Saving updated results...")
-    with open(results_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
-    
-    # Generate statistics
-    phases = {}
-    phase_match = 0
-    needs_review = 0
-    conf_dist = {'high': 0, 'medium': 0, 'low': 0}
-    predicted_match = 0
-    
-    for r in results:
-        p = r.get('expected_phase', 'unknown')
-        phases[p] = phases.get(p, 0) + 1
-        s = r.get('verification_summary', {})
-        
-        if s.get('phase_match'):
-            phase_match += 1
-        if s.get('predicted_phase') == p:
-            predicted_match += 1
-        if s.get('needs_review'):
-            needs_review += 1
+    # Existing results are streamed through and rewritten one record at a time
+    results_file = Path(r'D:\user\CEIPP\LLM\llm_verification_results\verification_results.json')
+    tmp_file = results_file.with_name(results_file.name + '.tmp')
+    
+    print("Processing existing verification results with improved logic...")
+    
+    # Statistics and review items are collected in the same pass
+    total = phase_match = predicted_match = 0
+    phases = Counter()
+    conf_dist = Counter({'high': 0, 'medium': 0, 'low': 0})  # levels with no results still print
+    review_items = []
+    
+    # The total is unknown while streaming, so read ahead past the parallel threshold
+    records = iter_json_array(results_file)
+    head = list(islice(records, PARALLEL_RECALC_THRESHOLD + 1))
+    records = chain(head, records)
+    parallel = len(head) > PARALLEL_RECALC_THRESHOLD
+    
+    with open(tmp_file, 'wb') as out, (ProcessPoolExecutor() if parallel else nullcontext()) as executor:
+        if executor:
+            updated = _recalculate_in_workers(executor, records)
+        else:
+            updated = map(_with_summary, records)
         
-        conf = s.get('confidence_level', 'low')
-        conf_dist[conf] = conf_dist.get(conf, 0) + 1
+        for r in updated:
+            # Write the result with its recalculated summary
+            out.write(b"[\n" if total == 0 else b",\n")
+            out.write(array_item_json(r))
+            total += 1
+            
+            p = r.get('expected_phase', 'unknown')
+            s = r['verification_summary']
+            phases[p] += 1
+            conf_dist[s.get('confidence_level', 'low')] += 1
+            phase_match += bool(s.get('phase_match'))
+            predicted_match += s.get('predicted_phase') == p
+            if s.get('needs_review'):
+                review_items.append(r)
+        out.write(b"\n]" if total else b"[]")
+    
+    # Replace the results file only once it has been read to the end
+    os.replace(tmp_file, results_file)
+    print(f"Saved {total} updated results")
     
     # Print summary
     print("\n" + "="*60)
     print("VERIFICATION RESULTS (REPROCESSED)")
     print("="*60)
-    print(f"Total images: {len(results)}")
+    print(f"Total images: {total}")
     
     print("\n--- By Phase ---")
     for p, c in sorted(phases.items()):
@@ -196,20 +279,18 @@ def main():
     
     print("\n--- Confidence Distribution ---")
     for c, n in sorted(conf_dist.items()):
-        pct = 100*n/len(results)
+        pct = 100*n/total
         print(f"  {c}: {n} ({pct:.1f}%)")
     
     print("\n--- Accuracy ---")
-    print(f"  Phase match (yes/no): {phase_match}/{len(results)} ({100*phase_match/len(results):.1f}%)")
-    print(f"  Predicted phase match: {predicted_match}/{len(results)} ({100*predicted_match/len(results):.1f}%)")
-    print(f"  Needs review: {needs_review}/{len(results)} ({100*needs_review/len(results):.1f}%)")
+    print(f"  Phase match (yes/no): {phase_match}/{total} ({100*phase_match/total:.1f}%)")
+    print(f"  Predicted phase match: {predicted_match}/{total} ({100*predicted_match/total:.1f}%)")
+    print(f"  Needs review: {len(review_items)}/{total} ({100*len(review_items)/total:.1f}%)")
     
     # Save needs_review items
-    review_items = [r for r in results if r.get('verification_summary', {}).get('needs_review')]
     if review_items:
         review_file = r'D:\user\CEIPP\LLM\llm_verification_results\needs_review.json'
-        with open(review_file, 'w', encoding='utf-8') as f:
-            json.dump(review_items, f, indent=2, ensure_ascii=False)
+        dump_json(review_items, review_file)
         print(f"\nSaved {len(review_items)} items needing review to needs_review.json")
     
     print("\n[OK] Reprocessing complete!")
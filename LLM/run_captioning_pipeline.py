@@ -13,14 +13,16 @@ Usage:
     python run_captioning_pipeline.py --mode verify_only
 """
 
-import json
 import os
 import sys
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional
 import argparse
 
+from json_io import array_item_json, count_json_items, dump_json, iter_captions, load_json
+
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
@@ -31,7 +33,7 @@ FILTER_PATH = BASE_PATH / "Filter"
 DATASET_ROOT = BASE_PATH / "_21p1_pjirayu_Seed-Crystallization-Dataset" / "balanced_crystallization"
 
 OUTPUT_FILES = {
-    "captions_v2": FILTER_PATH / "all_captions_VER2.json",
+    "captions_v2": FILTER_PATH / "all_captions_VER2.jsonl",
     "verification_prompts": LLM_PATH / "llm_verification_results" / "verification_prompts_prepared.json",
     "verification_results": LLM_PATH / "llm_verification_results" / "verification_results.json",
     "filtered_captions": LLM_PATH / "filtered_captions_final.json",
@@ -51,10 +53,10 @@ def run_caption_generation():
     try:
         from Filter.generate_captions_VER2 import process_dataset, save_captions
         
-        captions, statistics = process_dataset()
+        captions_by_phase, captions, statistics = process_dataset()
         
         if captions:
-            save_captions(captions, statistics)
+            save_captions(captions_by_phase, captions, statistics)
             print(f"\n[SUCCESS] Generated {len(captions)} captions")
             return True
         else:
@@ -155,51 +157,54 @@ def filter_and_analyze_results():
         return True
     
     # Load data
-    with open(verification_results_file, 'r', encoding='utf-8') as f:
-        verification_results = json.load(f)
-    
-    with open(captions_file, 'r', encoding='utf-8') as f:
-        captions = json.load(f)
+    verification_results = load_json(verification_results_file)
     
     # Create lookup dict
     verification_lookup = {
         r.get("image_name", ""): r for r in verification_results
     }
     
-    # Merge and filter
-    filtered_captions = []
-    needs_review = []
-    
-    for caption in captions:
-        image_name = caption.get("image", "")
-        verification = verification_lookup.get(image_name, {})
-        
-        # Add verification results to caption
-        caption["llm_verification"] = verification.get("verification_results", {})
-        caption["verification_summary"] = verification.get("verification_summary", {})
-        
-        # Check if needs review
-        if verification.get("verification_summary", {}).get("needs_review"):
-            caption["llm_verification_status"] = "needs_review"
-            needs_review.append(caption)
-        elif verification.get("verification_summary", {}).get("phase_match"):
-            caption["llm_verification_status"] = "verified"
-        else:
-            caption["llm_verification_status"] = "unverified"
-        
-        filtered_captions.append(caption)
-    
-    # Save filtered captions
+    # Merge and filter: captions are streamed and written one record at a time,
+    # statistics are counted in the same pass
     output_file = OUTPUT_FILES["filtered_captions"]
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(filtered_captions, f, indent=2, ensure_ascii=False)
-    print(f"[OK] Filtered captions saved to: {output_file}")
+    tmp_file = output_file.with_name(output_file.name + ".tmp")
+    total_count = 0
+    needs_review_count = 0
+    verified_count = 0
+    
+    with open(tmp_file, "wb") as out:
+        for caption in iter_captions(captions_file):
+            verification = verification_lookup.get(caption.get("image", ""))
+            if verification:
+                summary = verification.get("verification_summary", {})
+                caption["llm_verification"] = verification.get("verification_results", {})
+            else:
+                summary = {}
+                caption["llm_verification"] = {}
+            
+            # Add verification results to caption
+            caption["verification_summary"] = summary
+            
+            # Check if needs review
+            if summary.get("needs_review"):
+                caption["llm_verification_status"] = "needs_review"
+                needs_review_count += 1
+            elif summary.get("phase_match"):
+                caption["llm_verification_status"] = "verified"
+                verified_count += 1
+            else:
+                caption["llm_verification_status"] = "unverified"
+            
+            out.write(b"[\n" if total_count == 0 else b",\n")
+            out.write(array_item_json(caption))
+            total_count += 1
+        out.write(b"\n]" if total_count else b"[]")
     
-    # Statistics
-    verified_count = sum(1 for c in filtered_captions if c.get("llm_verification_status") == "verified")
-    needs_review_count = len(needs_review)
+    # Replace the filtered captions only once every caption has been written
+    os.replace(tmp_file, output_file)
+    print(f"[OK] Filtered captions saved to: {output_file}")
     
-    print(f"\n[STATS] Total captions: {len(filtered_captions)}")
+    print(f"\n[STATS] Total captions: {total_count}")
     print(f"[STATS] Verified: {verified_count}")
     print(f"[STATS] Needs review: {needs_review_count}")
     
@@ -225,44 +230,44 @@ def generate_final_report():
     # Check each output file
     for name, path in OUTPUT_FILES.items():
         if path.exists():
-            report["output_files"][name] = {
+            file_info = {
                 "path": str(path),
                 "exists": True,
                 "size_bytes": path.stat().st_size
             }
+            report["output_files"][name] = file_info
             
-            # Load and add stats for JSON files
+            # Count items in JSON arrays without building them in memory
             if path.suffix == '.json':
                 try:
-                    with open(path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    if isinstance(data, list):
-                        report["output_files"][name]["item_count"] = len(data)
+                    item_count = count_json_items(path)
+                    if item_count is not None:
+                        file_info["item_count"] = item_count
                 except:
                     pass
+            elif path.suffix == '.jsonl':
+                # One record per line - count without parsing
+                with open(path, 'rb') as f:
+                    file_info["item_count"] = sum(1 for line in f if line.strip())
         else:
             report["output_files"][name] = {"path": str(path), "exists": False}
     
     # Check captions statistics
     if OUTPUT_FILES["captions_v2"].exists():
-        with open(OUTPUT_FILES["captions_v2"], 'r', encoding='utf-8') as f:
-            captions = json.load(f)
-        
-        report["statistics"]["total_captions"] = len(captions)
-        report["statistics"]["by_phase"] = {}
-        report["statistics"]["by_material"] = {}
+        # Tally captions as they stream in (only phase and material are needed)
+        by_phase = Counter()
+        by_material = Counter()
+        for caption in iter_captions(OUTPUT_FILES["captions_v2"]):
+            by_phase[caption.get("phase", "unknown")] += 1
+            by_material[caption.get("category_id", "unknown")] += 1
         
-        for caption in captions:
-            phase = caption.get("phase", "unknown")
-            material = caption.get("category_id", "unknown")
-            
-            report["statistics"]["by_phase"][phase] = report["statistics"]["by_phase"].get(phase, 0) + 1
-            report["statistics"]["by_material"][material] = report["statistics"]["by_material"].get(material, 0) + 1
+        report["statistics"]["total_captions"] = sum(by_phase.values())
+        report["statistics"]["by_phase"] = dict(by_phase)
+        report["statistics"]["by_material"] = dict(by_material)
     
     # Save report
     report_file = FILTER_PATH / "pipeline_report.json"
-    with open(report_file, 'w', encoding='utf-8') as f:
-        json.dump(report, f, indent=2, ensure_ascii=False)
+    dump_json(report, report_file)
     
     print(f"[OK] Report saved to: {report_file}")
     